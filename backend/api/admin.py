@@ -25,16 +25,16 @@ class RecipeAdmin(admin.ModelAdmin):
         'image', 'author'
     )
     list_display = (
-        'pk', 'name', 'author', 'in_favorites',
+        'pk', 'name', 'author', 'in_favorites', 'cart_count',
         'cooking_time', 'text', 'tags', 'image'
     )
     list_filter = ('name', 'author', 'tags')
-    readonly_fields = ('in_favorites',)
+    readonly_fields = ('in_favorites', 'cart_count')
     empty_value_display = 'пусто'
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def in_favorites(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
     def tags(self, obj):
         [tags.name for tags in obj.tags.all()[:MAX_DISPLAY]]
@@ -56,3 +56,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     list_editable = ('user', 'recipe')
+
+
+@admin.register(models.ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'total_amount')
+    list_select_related = ('user', 'ingredient')
+    readonly_fields = ('user', 'ingredient', 'total_amount')
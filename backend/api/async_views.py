@@ -0,0 +1,102 @@
+from functools import update_wrapper, wraps
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.response import Response
+
+from backend.metrics import watch_queries
+
+# Действия, которые при ASYNC_VIEWS обслуживаются асинхронным видом.
+ASYNC_ACTIONS = ('list', 'retrieve')
+
+
+def run_in_thread(func, *args, thread_sensitive=False, **kwargs):
+    """Выполняет синхронный код с ORM в потоке, не блокируя event loop.
+
+    В Django 3.2 нет асинхронного ORM, поэтому запросы к базе идут
+    через sync_to_async. По умолчанию каждый вызов попадает в свой
+    поток со своим соединением, так что независимые запросы можно
+    выполнять одновременно через asyncio.gather. После вызова
+    соединения потока закрываются по правилам CONN_MAX_AGE, как в
+    конце обычного запроса.
+    """
+
+    @wraps(func)
+    def call():
+        watch_queries()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if not thread_sensitive:
+                close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=thread_sensitive)()
+
+
+class AsyncReadMixin:
+    """Асинхронные list и retrieve для запуска под ASGI.
+
+    При ASYNC_VIEWS = True маршрут, у которого GET ведет на list или
+    retrieve, получает асинхронный вид. Стандартный dispatch DRF
+    (аутентификация, права, исключения, finalize_response) выполняется
+    в потоке как есть, а обработчик с <action>_async возвращается
+    в event loop и может запускать свои запросы одновременно.
+    Остальные методы того же маршрута выполняются прежним синхронным
+    видом.
+    """
+
+    async def list_async(self, request, *args, **kwargs):
+        """list, где пагинатор сам выполняет запросы страницы параллельно.
+
+        Без apaginate_queryset у пагинатора (или без пагинации вовсе)
+        выполняется обычный list в потоке.
+        """
+        paginate = getattr(self.paginator, 'apaginate_queryset', None)
+        if paginate is None:
+            return await run_in_thread(self.list, request, *args, **kwargs)
+        queryset = await run_in_thread(
+            lambda: self.filter_queryset(self.get_queryset())
+        )
+        page = await paginate(queryset, request, view=self)
+        serializer = self.get_serializer(
+            queryset if page is None else page, many=True
+        )
+        data = await run_in_thread(lambda: serializer.data)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        sync_view = super().as_view(actions, **initkwargs)
+        if (
+            not settings.ASYNC_VIEWS
+            or sync_view.actions.get('get') not in ASYNC_ACTIONS
+        ):
+            return sync_view
+        actions = sync_view.actions
+
+        async def view(request, *args, **kwargs):
+            if actions.get(request.method.lower()) not in ASYNC_ACTIONS:
+                return await run_in_thread(
+                    sync_view, request, *args,
+                    thread_sensitive=True, **kwargs
+                )
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, action in actions.items():
+                handler = getattr(self, f'{action}_async', None)
+                setattr(self, method, (
+                    getattr(self, action) if handler is None
+                    else async_to_sync(handler)
+                ))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await run_in_thread(self.dispatch, request, *args, **kwargs)
+
+        # Вместе с атрибутами cls, actions и csrf_exempt: csrf_exempt()
+        # обернул бы корутину в синхронную функцию.
+        update_wrapper(view, sync_view)
+        return view
@@ -0,0 +1,137 @@
+from django.db import connection
+from django.db.models import Exists, F, OuterRef
+
+from api.feed import backfill
+from api.models import (Favorite, RecipeIngredient, ShoppingCart,
+                        ShoppingListItem)
+from users.models import Subscribe
+
+
+class BulkRelation:
+    """Пакетное добавление и удаление связей пользователя с объектами.
+
+    id проверяются одним запросом вместе с наличием связи. Добавление —
+    один INSERT ... ON CONFLICT DO NOTHING RETURNING (Postgres, SQLite
+    3.35+): он не отправляет сигналы, поэтому счетчик объекта меняется
+    здесь одним UPDATE только для реально вставленных строк, а остальные
+    последствия — в after_add. Удаление идет через delete(), счетчики
+    и прочее обновляют сигналы модели; строки предварительно
+    блокируются, чтобы не удалять то, что уже удалил одновременный
+    запрос.
+    """
+
+    def __init__(self, model, field, counter):
+        self.model = model
+        self.field = field
+        self.counter = counter
+        self.target = model._meta.get_field(field).related_model
+
+    def resolve(self, user, ids):
+        """Словарь id -> есть ли уже связь, только для существующих id."""
+        return dict(
+            self.target.objects.filter(pk__in=ids).annotate(
+                linked=Exists(self.model.objects.filter(
+                    user=user, **{self.field: OuterRef('pk')}
+                ))
+            ).values_list('pk', 'linked')
+        )
+
+    def shift(self, ids, delta):
+        if ids:
+            self.target.objects.filter(pk__in=ids).update(
+                **{self.counter: F(self.counter) + delta}
+            )
+
+    def insert(self, user, ids):
+        """Вставляет связи и возвращает id, для которых строка добавлена.
+
+        Связи, которые успел создать одновременный запрос, пропускаются.
+        """
+        if not ids:
+            return []
+        meta = self.model._meta
+        quote = connection.ops.quote_name
+        column = quote(meta.get_field(self.field).column)
+        sql = (
+            'INSERT INTO {table} ({user}, {column}) VALUES {values} '
+            'ON CONFLICT DO NOTHING RETURNING {column}'
+        ).format(
+            table=quote(meta.db_table),
+            user=quote(meta.get_field('user').column),
+            column=column,
+            values=', '.join(['(%s, %s)'] * len(ids))
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql, [value for pk in ids for value in (user.pk, pk)]
+            )
+            return [pk for pk, in cursor.fetchall()]
+
+    def add(self, user, ids):
+        found = self.resolve(user, ids)
+        created = self.insert(
+            user, [pk for pk, linked in found.items() if not linked]
+        )
+        self.shift(created, 1)
+        if created:
+            self.after_add(user, created)
+        return self.results(
+            ids, found, created, ('created', 'exists', 'not_found')
+        )
+
+    def remove(self, user, ids):
+        found = self.resolve(user, ids)
+        links = self.model.objects.filter(user=user, **{
+            f'{self.field}__in': [pk for pk, linked in found.items() if linked]
+        })
+        deleted = list(
+            links.select_for_update()
+            .values_list(f'{self.field}_id', flat=True)
+        )
+        if deleted:
+            links.filter(**{f'{self.field}__in': deleted}).delete()
+        return self.results(
+            ids, found, deleted, ('deleted', 'missing', 'not_found')
+        )
+
+    def results(self, ids, found, changed, statuses):
+        changed = set(changed)
+        done, skipped, unknown = statuses
+        return [
+            {
+                'id': pk,
+                'status': (
+                    done if pk in changed
+                    else skipped if pk in found else unknown
+                ),
+            }
+            for pk in ids
+        ]
+
+    def after_add(self, user, ids):
+        pass
+
+
+class ShoppingCartRelation(BulkRelation):
+    def after_add(self, user, ids):
+        ShoppingListItem.objects.refresh(
+            [user.pk],
+            RecipeIngredient.objects.filter(recipe__in=ids)
+            .values('ingredient')
+        )
+
+
+class SubscribeRelation(BulkRelation):
+    def resolve(self, user, ids):
+        found = super().resolve(user, ids)
+        # На себя подписаться нельзя: такой id считается ненайденным.
+        found.pop(user.pk, None)
+        return found
+
+    def after_add(self, user, ids):
+        backfill(user.pk, ids)
+
+
+favorites = BulkRelation(Favorite, 'recipe', 'favorites_count')
+shopping_cart = ShoppingCartRelation(ShoppingCart, 'recipe', 'cart_count')
+subscriptions = SubscribeRelation(Subscribe, 'author', 'followers_count')
@@ -0,0 +1,327 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from api.async_views import run_in_thread
+from api.constants import RESPONSE_CACHE_POLL_INTERVAL
+
+VERSION_KEY = 'foodgram:version:{}'
+RESPONSE_KEY = 'foodgram:response:{}'
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш ограниченного размера внутри процесса."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+local_cache = LRUCache(settings.REFERENCE_DATA_LOCAL_CACHE_SIZE)
+
+
+def check_shared_caches():
+    """Проверяет, что версии и ответы лежат в общем для процессов кэше.
+
+    Версию меняет тот процесс, который изменил данные: воркер, load_data
+    или recount. В кэше одного процесса остальные ее не увидят и будут
+    отдавать старые списки, ответы и даже 304 по старому ETag.
+    """
+    for alias in {settings.REFERENCE_DATA_CACHE, settings.RESPONSE_CACHE}:
+        if isinstance(caches[alias], PROCESS_LOCAL_CACHES):
+            raise ImproperlyConfigured(
+                f'Cache {alias!r} is local to the process: versions and '
+                f'cached responses need a shared backend such as '
+                f'FileBasedCache, memcached or Redis.'
+            )
+
+
+def get_version_cache():
+    return caches[settings.REFERENCE_DATA_CACHE]
+
+
+def get_version(namespace):
+    """Возвращает версию данных: время последнего изменения в мс.
+
+    Версии хранятся в общем кэше Django (см. check_shared_caches),
+    поэтому инвалидация видна всем процессам.
+    """
+    cache = get_version_cache()
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    cache = get_version_cache()
+    key = VERSION_KEY.format(namespace)
+    version = max(int(time.time() * 1000), (cache.get(key) or 0) + 1)
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def get_versions(namespaces):
+    """Версии нескольких пространств имен одним get_many."""
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    found = get_version_cache().get_many(keys)
+    return tuple(
+        found[key] if key in found else get_version(namespace)
+        for key, namespace in zip(keys, namespaces)
+    )
+
+
+def bump_versions(namespaces):
+    cache = get_version_cache()
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    now = int(time.time() * 1000)
+    cache.set_many(
+        {key: max(now, found.get(key, 0) + 1) for key in keys},
+        timeout=None
+    )
+
+
+def recipe_namespace(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def invalidate_recipes(recipe_ids):
+    """Сбрасывает кэш ленты и карточек рецептов после коммита.
+
+    Версии меняются только после коммита: иначе параллельный запрос
+    успел бы сохранить старые данные уже под новыми версиями.
+    """
+    namespaces = ['recipes', *map(recipe_namespace, recipe_ids)]
+    transaction.on_commit(lambda: bump_versions(namespaces))
+
+
+def get_cached(namespace, name, loader):
+    """Значение loader(), вычисленное один раз на версию пространства имен."""
+    key = (namespace, get_version(namespace), name)
+    value = local_cache.get(key)
+    if value is None:
+        value = loader()
+        local_cache.set(key, value)
+    return value
+
+
+class VersionedListCacheMixin:
+    """Отдает list() из кэша отрендеренных байтов с ETag/Last-Modified.
+
+    Ключ кэша — версия пространства имен и нормализованная строка
+    запроса, так что после изменения данных старые записи просто
+    перестают запрашиваться и вытесняются LRU.
+    """
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        version = get_version(self.cache_namespace)
+        query = '&'.join(
+            f'{key}={value}'
+            for key, values in sorted(request.query_params.lists())
+            for value in values
+        )
+        etag = '"{}-{}-{}"'.format(
+            self.cache_namespace, version,
+            hashlib.md5(
+                f'{query}|{request.accepted_media_type}'.encode()
+            ).hexdigest()[:12]
+        )
+        last_modified = version // 1000
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(
+                self.get_rendered_body(request, version, query),
+                content_type=get_content_type(renderer)
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_rendered_body(self, request, version, query):
+        key = (self.cache_namespace, version, query,
+               request.accepted_media_type)
+        body = local_cache.get(key)
+        if body is None:
+            data = super().list(request).data
+            body = request.accepted_renderer.render(
+                data, request.accepted_media_type, self.get_renderer_context()
+            )
+            local_cache.set(key, body)
+        return body
+
+
+class AnonymousResponseCacheMixin:
+    """Кэш отрендеренных ответов list и retrieve для анонимов.
+
+    Ответ анониму зависит только от данных и строки запроса, поэтому
+    его байты хранятся в кэше RESPONSE_CACHE вместе с версиями
+    пространств имен, прочитанными до расчета. Пространства имен
+    задает обязательный атрибут cache_namespaces: словарь действие ->
+    шаблоны имен, которые заполняются из self.kwargs ('recipe:{pk}').
+    Запись годится, пока версии не изменились: после bump_version
+    ответ просто пересчитывается. Промах берет блокировку через
+    cache.add, и одновременные запросы с тем же ключом ждут ее
+    результат, а не выполняют те же запросы к базе. И записи, и
+    блокировка работают между воркерами, только если RESPONSE_CACHE
+    общий для процессов (см. check_shared_caches), а его add()
+    атомарен, как у memcached, Redis и core.cache.AtomicFileBasedCache.
+    """
+
+    cache_namespaces = None
+
+    def get_cache_namespaces(self):
+        assert self.cache_namespaces is not None, (
+            f'{type(self).__name__} should include a `cache_namespaces` '
+            f'attribute.'
+        )
+        return tuple(
+            namespace.format(**self.kwargs)
+            for namespace in self.cache_namespaces[self.action]
+        )
+
+    def is_response_cacheable(self, request):
+        return (
+            request.method == 'GET'
+            and not request.user.is_authenticated
+            and request.accepted_renderer.format == 'json'
+        )
+
+    def list(self, request, *args, **kwargs):
+        compute = partial(super().list, request, *args, **kwargs)
+        if not self.is_response_cacheable(request):
+            return compute()
+        return self.get_cached_response(request, compute)
+
+    def retrieve(self, request, *args, **kwargs):
+        compute = partial(super().retrieve, request, *args, **kwargs)
+        if not self.is_response_cacheable(request):
+            return compute()
+        return self.get_cached_response(request, compute)
+
+    async def list_async(self, request, *args, **kwargs):
+        # Попадание в кэш дешевле параллельных COUNT(*) и страницы.
+        if not self.is_response_cacheable(request):
+            return await super().list_async(request, *args, **kwargs)
+        return await run_in_thread(self.list, request, *args, **kwargs)
+
+    def get_response_key(self, request):
+        """Ключ из действия, объекта, хоста и нормализованной строки запроса.
+
+        Хост входит в ключ, потому что ссылки в ответе абсолютные.
+        """
+        query = '&'.join(
+            f'{key}={value}'
+            for key, values in sorted(request.query_params.lists())
+            for value in values
+        )
+        return RESPONSE_KEY.format(hashlib.md5('|'.join((
+            self.action, str(self.kwargs.get(self.lookup_field, '')),
+            request.scheme, request.get_host(), query,
+            request.accepted_media_type,
+        )).encode()).hexdigest())
+
+    def get_cached_response(self, request, compute):
+        cache = caches[settings.RESPONSE_CACHE]
+        key = self.get_response_key(request)
+        lock = f'{key}:lock'
+        versions = get_versions(self.get_cache_namespaces())
+        entry = cache.get(key)
+        if entry is not None and entry[0] == versions:
+            return self.make_response(request, entry[1])
+        locked = cache.add(
+            lock, True, timeout=settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        )
+        if not locked:
+            body = self.wait_for_response(cache, key, lock, versions)
+            if body is not None:
+                return self.make_response(request, body)
+        try:
+            response = compute()
+            if response.status_code != 200:
+                return response
+            body = request.accepted_renderer.render(
+                response.data, request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            cache.set(
+                key, (versions, body),
+                timeout=settings.RESPONSE_CACHE_TIMEOUT
+            )
+        finally:
+            if locked:
+                cache.delete(lock)
+        return self.make_response(request, body)
+
+    def wait_for_response(self, cache, key, lock, versions):
+        """Ждет ответ, который считает владелец блокировки.
+
+        None — владелец не успел за RESPONSE_CACHE_LOCK_TIMEOUT или
+        отпустил блокировку без записи (например, ответ не 200):
+        тогда запрос считает ответ сам.
+        """
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(RESPONSE_CACHE_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == versions:
+                return entry[1]
+            if cache.get(lock) is None:
+                # Запись могла появиться между двумя get.
+                entry = cache.get(key)
+                if entry is not None and entry[0] == versions:
+                    return entry[1]
+                return None
+        return None
+
+    def make_response(self, request, body):
+        return HttpResponse(
+            body, content_type=get_content_type(request.accepted_renderer)
+        )
+
+
+def get_content_type(renderer):
+    if renderer.charset:
+        return f'{renderer.media_type}; charset={renderer.charset}'
+    return renderer.media_type
@@ -2,3 +2,31 @@ MAX_FIELDS_LENGHT = 200
 MAX_DISPLAY = 3
 MIN_FIELD_NUM = 1
 MAX_FIELD_NUM = 32000
+SHOPPING_LIST_TITLE = 'Cписок покупок:'
+SHOPPING_LIST_CHUNK_SIZE = 2000
+FEED_BATCH_SIZE = 1000
+# Насколько лента может перерасти FEED_MAX_LENGTH (доля), прежде чем
+# запись ее обрежет.
+FEED_TRIM_SLACK = 0.1
+BULK_MAX_IDS = 100
+# Как часто ждущий запрос проверяет кэш, пока ответ считает другой.
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+# Конфигурация полнотекстового поиска Postgres для рецептов.
+SEARCH_CONFIG = 'russian'
+# Колонки превью рецептов в подписках: поля RecipeSerializer и автор.
+RECIPE_PREVIEW_FIELDS = (
+    'author', 'name', 'image', 'image_variants', 'cooking_time'
+)
+PDF_FONT_SIZE = 12
+# Символов в строке: DejaVu Sans шире Helvetica, 64 знака кегля 12
+# помещаются между полями A4.
+PDF_LINE_WIDTH = 64
+PDF_LINES_PER_PAGE = 46
+# Варианты ?ordering= ленты рецептов. Последние поля — общий
+# детерминированный хвост, на нем же строится курсор пагинации.
+RECIPE_ORDERINGS = {
+    'recent': ('-pub_date', '-id'),
+    'popular': ('-favorites_count', '-pub_date', '-id'),
+    'quickest': ('cooking_time', '-pub_date', '-id'),
+}
+DEFAULT_RECIPE_ORDERING = 'recent'
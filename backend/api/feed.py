@@ -0,0 +1,167 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from api.constants import FEED_BATCH_SIZE, FEED_TRIM_SLACK
+from api.models import FeedEntry, Recipe
+from users.models import Subscribe, User
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.FEED_WORKERS,
+    thread_name_prefix='feed'
+)
+
+
+def add_entries(user_ids, recipe_ids):
+    """Добавляет рецепты в ленты и обрезает переросшие ленты.
+
+    user_ids может быть queryset: обрезка берет его подзапросом.
+    """
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipe_ids
+        ],
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim(
+        settings.FEED_MAX_LENGTH, user_ids,
+        slack=int(settings.FEED_MAX_LENGTH * FEED_TRIM_SLACK)
+    )
+
+
+def deliver(author_id, recipe_ids):
+    add_entries(
+        Subscribe.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True),
+        recipe_ids
+    )
+
+
+def run_in_background(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Feed task %s%r failed', task.__name__, args)
+    finally:
+        connection.close()
+
+
+def schedule(followers, task, *args):
+    """Небольшую аудиторию обслуживает сразу, большую — в пуле после
+    коммита."""
+    if followers <= settings.FEED_SYNC_FANOUT:
+        task(*args)
+        return
+    transaction.on_commit(
+        lambda: executor.submit(run_in_background, task, *args)
+    )
+
+
+def recent_recipes(author_ids):
+    return list(
+        Recipe.objects.filter(author_id__in=author_ids)
+        .order_by('-pub_date', '-id')
+        .values_list('id', flat=True)[:settings.FEED_MAX_LENGTH]
+    )
+
+
+def fan_out(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора.
+
+    Рецепты «знаменитостей» не раскладываются: их подмешивает
+    feed_querysets.
+    """
+    followers = recipe.author.followers_count
+    if not followers or followers >= settings.FEED_CELEBRITY_FOLLOWERS:
+        return
+    schedule(followers, deliver, recipe.author_id, [recipe.pk])
+
+
+def deliver_author(author_id):
+    deliver(author_id, recent_recipes([author_id]))
+
+
+def followers_lost(author_ids):
+    """Раскладывает рецепты авторов, переставших быть «знаменитостями».
+
+    Пока подписчиков было не меньше FEED_CELEBRITY_FOLLOWERS, рецепты
+    автора подмешивались при чтении и в ленты не попадали; после
+    отписки, опустившей счетчик ниже порога, их нужно разложить.
+    Вызывается после уменьшения followers_count на единицу. Если
+    одновременные отписки проскочат порог вместе, ленты восстановит
+    manage.py rebuild_feeds --backfill.
+    """
+    threshold = settings.FEED_CELEBRITY_FOLLOWERS
+    demoted = User.objects.filter(
+        pk__in=author_ids, followers_count=threshold - 1
+    ).values_list('pk', flat=True)
+    for author_id in demoted:
+        schedule(threshold - 1, deliver_author, author_id)
+
+
+def backfill(user_id, author_ids):
+    """Добавляет в ленту последние рецепты авторов, на которых подписались."""
+    add_entries([user_id], recent_recipes(
+        User.objects.filter(
+            pk__in=author_ids,
+            followers_count__lt=settings.FEED_CELEBRITY_FOLLOWERS
+        ).values('pk')
+    ))
+
+
+def forget(user_id, author_ids):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+def trim(max_length, user_ids=None, slack=0):
+    """Оставляет в лентах max_length самых новых рецептов.
+
+    Без user_ids проверяются все ленты. Обрезаются только ленты длиннее
+    max_length + slack: запас позволяет при записи удалять лишнее
+    пачкой раз в несколько рецептов, а не после каждого.
+    """
+    feeds = FeedEntry.objects.order_by()
+    if user_ids is not None:
+        feeds = feeds.filter(user_id__in=user_ids)
+    users = list(
+        feeds.values('user').annotate(total=Count('id'))
+        .filter(total__gt=max_length + slack)
+        .values_list('user', flat=True)
+    )
+    deleted = 0
+    for user_id in users:
+        stale = list(
+            FeedEntry.objects.filter(user_id=user_id)
+            .order_by('-recipe__pub_date', '-recipe_id')
+            .values_list('id', flat=True)[max_length:]
+        )
+        deleted += FeedEntry.objects.filter(id__in=stale).delete()[0]
+    return deleted
+
+
+def feed_querysets(user, queryset):
+    """Части ленты пользователя для FeedPagination.
+
+    Разложенные записи плюс рецепты «знаменитостей» из подписок:
+    их читаем напрямую, чтобы не писать запись каждому подписчику.
+    """
+    querysets = [queryset.filter(feed_entries__user=user)]
+    celebrities = list(
+        Subscribe.objects.filter(
+            user=user,
+            author__followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS
+        ).values_list('author_id', flat=True)
+    )
+    if celebrities:
+        querysets.append(queryset.filter(author_id__in=celebrities))
+    return querysets
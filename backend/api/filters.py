@@ -1,23 +1,133 @@
+from django.db import connection
+from django.db.models import Exists, IntegerField, OuterRef, Value
+from django.db.models.functions import Lower
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
+from .cache import get_cached
+from .constants import RECIPE_ORDERINGS
 from .models import Recipe, Tag
+from .pagination import FoodgramPagination
+from .search import search_recipes
+
+
+def get_tag_ids():
+    """Словарь slug -> id тегов, сбрасывается при изменении тегов."""
+    return get_cached(
+        'tags', 'slug_to_id',
+        lambda: dict(Tag.objects.values_list('slug', 'id'))
+    )
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """Поиск ингредиентов для автодополнения.
+
+    Сначала идут совпадения по началу названия, затем по подстроке.
+    На Postgres поиск идет по lower(name), для которого миграция создает
+    btree-индекс text_pattern_ops и триграммный GIN-индекс; на остальных
+    базах используются обычные istartswith/icontains.
+    """
+
+    search_param = api_settings.SEARCH_PARAM
+    limit_param = 'limit'
+
+    def get_limit(self, request):
+        limit = request.query_params.get(self.limit_param, '')
+        return int(limit) if limit.isdigit() and int(limit) else None
+
+    def get_lookups(self, queryset):
+        if connection.vendor == 'postgresql':
+            return (
+                queryset.annotate(search_name=Lower('name')),
+                'search_name__startswith',
+                'search_name__contains',
+            )
+        return queryset, 'name__istartswith', 'name__icontains'
+
+    def filter_queryset(self, request, queryset, view):
+        if view.action != 'list':
+            return queryset
+        query = request.query_params.get(self.search_param, '').strip()
+        limit = self.get_limit(request)
+        if not query:
+            return queryset[:limit] if limit else queryset
+        queryset, prefix_lookup, contains_lookup = self.get_lookups(
+            queryset.order_by()
+        )
+        query = query.lower()
+        prefix = queryset.filter(**{prefix_lookup: query}).annotate(
+            search_rank=Value(0, output_field=IntegerField())
+        )
+        contains = queryset.filter(**{contains_lookup: query}).exclude(
+            **{prefix_lookup: query}
+        ).annotate(search_rank=Value(1, output_field=IntegerField()))
+        features = connection.features
+        if limit and features.supports_slicing_ordering_in_compound:
+            prefix = prefix.order_by('name')[:limit]
+            contains = contains.order_by('name')[:limit]
+        queryset = prefix.union(contains, all=True).order_by(
+            'search_rank', 'name'
+        )
+        return queryset[:limit] if limit else queryset
 
 
 class RecipesFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        to_field_name='slug',
-        field_name='tags__slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='tags_filter'
     )
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter')
+    # Объявлен до ordering: явная сортировка заменяет сортировку
+    # по релевантности.
+    search = filters.CharFilter(method='search_filter')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='ordering_filter'
+    )
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
+    def tags_filter(self, queryset, name, value):
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag_id__in=[
+                    tag_ids[slug] for slug in value if slug in tag_ids
+                ]
+            )
+        ))
+
+    def search_filter(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        # Курсор строится по полям сортировки без ранга релевантности;
+        # с явным ordering ранг в сортировке не участвует.
+        params = self.request.query_params
+        if (
+            FoodgramPagination.cursor_query_param in params
+            and not params.get('ordering')
+        ):
+            raise ValidationError(
+                {name: 'Поиск нельзя сочетать с cursor, используйте page.'}
+            )
+        return search_recipes(queryset, value)
+
+    def ordering_filter(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
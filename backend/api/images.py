@@ -0,0 +1,98 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from api.cache import invalidate_recipes
+from api.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images'
+)
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True,
+             'progressive': True},
+}
+
+
+def variant_name(original, variant, image_format):
+    stem = os.path.splitext(os.path.basename(original))[0]
+    return f'recipes/variants/{stem}/{variant}.{image_format}'
+
+
+def encode(image, image_format):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        if 'A' in image.getbands():
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = BytesIO()
+    # Новый объект Image не несет EXIF и ICC исходника,
+    # так что метаданные в варианты не попадают.
+    image.save(buffer, **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def build_variants(original):
+    """Строит варианты картинки и возвращает их описание для API.
+
+    Вариант не увеличивает картинку: если исходник уже меньше нужной
+    ширины, он сохраняется в исходном размере.
+    """
+    with default_storage.open(original) as file:
+        source = Image.open(file)
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert(
+                'RGBA' if 'transparency' in source.info else 'RGB'
+            )
+        source.load()
+    variants = {}
+    for variant, width in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = source.copy()
+        image.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        variants[variant] = {'width': image.width, 'height': image.height}
+        for image_format in settings.RECIPE_IMAGE_FORMATS:
+            name = variant_name(original, variant, image_format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[variant][image_format] = default_storage.save(
+                name, ContentFile(encode(image, image_format))
+            )
+    return variants
+
+
+def process_recipe_image(recipe_id, original):
+    try:
+        variants = build_variants(original)
+        # Если картинку успели заменить, результат уже не нужен.
+        if Recipe.objects.filter(pk=recipe_id, image=original).update(
+            image_variants=variants
+        ):
+            invalidate_recipes([recipe_id])
+    except Exception:
+        logger.exception('Failed to build variants for %s', original)
+    finally:
+        connection.close()
+
+
+def schedule_image_variants(recipe):
+    """Отправляет картинку рецепта в пул после коммита транзакции."""
+    if not recipe.image:
+        return
+    recipe_id, original = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(process_recipe_image, recipe_id, original)
+    )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.images import executor, process_recipe_image
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/JPEG variants for recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild variants that already exist too.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        jobs = list(recipes.values_list('pk', 'image'))
+        # list() дожидается завершения всех задач пула.
+        list(executor.map(lambda job: process_recipe_image(*job), jobs))
+        self.stdout.write(f'Image variants built for {len(jobs)} recipes.')
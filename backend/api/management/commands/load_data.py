@@ -1,33 +1,140 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
-from api.models import Ingredient
-from django.core.management.base import BaseCommand
-from progress.bar import IncrementalBar
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.cache import bump_version
+from api.models import Ingredient, Tag
 from backend import settings
 
+DEFAULT_FILES = ('data/ingredients.csv', 'data/tags.json')
+BATCH_SIZE = 5000
+MODELS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit')),
+    'tags': (Tag, ('name', 'color', 'slug')),
+}
+# Postgres: строки копируются во временную таблицу, а дубликаты
+# отбрасывает ON CONFLICT по уникальному ограничению. Строку заголовка,
+# как и read_csv, убирает DELETE: у COPY ... HEADER ее нельзя сделать
+# необязательной.
+COPY_SQL = (
+    'CREATE TEMP TABLE ingredient_staging '
+    '(name varchar, measurement_unit varchar)',
+    'COPY ingredient_staging (name, measurement_unit) '
+    'FROM STDIN WITH (FORMAT csv)',
+    'DELETE FROM ingredient_staging '
+    "WHERE name = 'name' AND measurement_unit = 'measurement_unit'",
+    'INSERT INTO {table} (name, measurement_unit) '
+    'SELECT DISTINCT name, measurement_unit FROM ingredient_staging '
+    'ON CONFLICT (name, measurement_unit) DO NOTHING',
+    # Не ON COMMIT DROP: внешняя транзакция (тесты, повторный вызов из
+    # кода) может держать таблицу до следующей загрузки.
+    'DROP TABLE ingredient_staging',
+)
+
+
+def read_csv(file, fields):
+    reader = csv.reader(file)
+    for row in reader:
+        if list(row) == list(fields):
+            continue
+        yield dict(zip(fields, row))
 
-def ingredient_create(row):
-    Ingredient.objects.get_or_create(
-        name=row[0],
-        measurement_unit=row[1]
-    )
+
+def read_json(file, fields):
+    for item in json.load(file):
+        yield {field: item.get(field) for field in fields}
 
 
 class Command(BaseCommand):
-    help = "Load data to DB"
+    help = (
+        'Load ingredients and tags from CSV or JSON files. '
+        'The model is chosen by the file name prefix.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=DEFAULT_FILES,
+            help='Files relative to BASE_DIR or absolute paths.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Rows per bulk_create batch.'
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Use bulk_create even on Postgres.'
+        )
 
     def handle(self, *args, **options):
-        path = os.path.join(settings.BASE_DIR, 'data/ingredients.csv')
-        with open(path, 'r', encoding='utf-8') as file:
-            count = sum(1 for row in file)
-        with open(path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            custom_bar = IncrementalBar('ingredients.csv'.ljust(17), max=count)
-            next(reader)
-            for row in reader:
-                custom_bar.next()
-                ingredient_create(row)
-            custom_bar.finish()
-        self.stdout.write("Data has been loaded succesfully.")
+        for path in options['paths']:
+            path = os.path.join(settings.BASE_DIR, path)
+            namespace, model, fields = self.get_model(path)
+            started = time.monotonic()
+            with open(path, 'r', encoding='utf-8') as file:
+                if self.can_copy(model, path, options):
+                    total = self.copy(file)
+                else:
+                    total = self.bulk_load(
+                        model, fields, path, file, options['batch_size']
+                    )
+            # bulk_create и COPY не отправляют сигналы post_save.
+            bump_version(namespace)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{os.path.basename(path)}: {total} rows '
+                f'in {elapsed:.2f} s ({total / elapsed:.0f} rows/s)'
+            )
+        self.stdout.write('Data has been loaded succesfully.')
+
+    def get_model(self, path):
+        """(пространство имен кэша, модель, поля) по началу имени файла.
+
+        Подходят, например, ingredients.csv и ingredients_extra.json.
+        """
+        name = os.path.basename(path)
+        for prefix, (model, fields) in MODELS.items():
+            if name.startswith(prefix):
+                return prefix, model, fields
+        raise CommandError(
+            f'Unknown data file {path}, expected a name starting with: '
+            + ', '.join(MODELS)
+        )
+
+    def can_copy(self, model, path, options):
+        return (
+            model is Ingredient
+            and path.endswith('.csv')
+            and connection.vendor == 'postgresql'
+            and not options['no_copy']
+        )
+
+    @transaction.atomic
+    def copy(self, file):
+        create, copy, skip_header, insert, drop = COPY_SQL
+        with connection.cursor() as cursor:
+            cursor.execute(create)
+            cursor.copy_expert(copy, file)
+            cursor.execute(skip_header)
+            cursor.execute('SELECT count(*) FROM ingredient_staging')
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                insert.format(table=Ingredient._meta.db_table)
+            )
+            cursor.execute(drop)
+        return total
+
+    def bulk_load(self, model, fields, path, file, batch_size):
+        reader = read_csv if path.endswith('.csv') else read_json
+        rows = reader(file, fields)
+        total = 0
+        while True:
+            batch = [model(**row) for row in islice(rows, batch_size)]
+            if not batch:
+                return total
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.feed import backfill, trim
+from users.models import Subscribe
+
+
+class Command(BaseCommand):
+    help = (
+        'Trim subscription feeds to FEED_MAX_LENGTH recipes; with '
+        '--backfill fill them from existing subscriptions first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Add recent recipes of followed authors to every feed.'
+        )
+        parser.add_argument(
+            '--max-length',
+            type=int,
+            default=settings.FEED_MAX_LENGTH,
+            help='Entries to keep in each feed.'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            subscriptions = Subscribe.objects.order_by().values_list(
+                'user_id', 'author_id'
+            )
+            authors = defaultdict(list)
+            for user_id, author_id in subscriptions:
+                authors[user_id].append(author_id)
+            for user_id, author_ids in authors.items():
+                backfill(user_id, author_ids)
+            self.stdout.write(f'Backfilled {len(authors)} feeds.')
+        deleted = trim(options['max_length'])
+        self.stdout.write(f'Trimmed {deleted} feed entries.')
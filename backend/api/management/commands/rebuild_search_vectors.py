@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import Recipe
+from api.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate full-text search vectors of recipes, e.g. after '
+        'loading data in bulk. Postgres only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Recipes updated by one UPDATE.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('Search vectors are kept on Postgres only.')
+            return
+        batch_size = options['batch_size']
+        # Пачками по диапазонам id, чтобы не держать одну долгую
+        # транзакцию на всю таблицу.
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        total = 0
+        for start in range(0, last_id, batch_size):
+            total += update_search_vectors(Recipe.objects.filter(
+                id__gt=start, id__lte=start + batch_size
+            ))
+        self.stdout.write(f'Updated {total} recipes.')
@@ -0,0 +1,102 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+
+from api.models import ShoppingCart, ShoppingListItem
+
+BATCH_SIZE = 2000
+MAX_REPORTED = 20
+
+
+def live_totals():
+    return (
+        ShoppingCart.objects
+        .filter(recipe__recipes__isnull=False)
+        .values('user_id', ingredient_id=F('recipe__recipes__ingredient'))
+        .annotate(total_amount=Sum('recipe__recipes__amount'))
+        .order_by('user_id', 'ingredient_id')
+        .values_list('user_id', 'ingredient_id', 'total_amount')
+    )
+
+
+def stored_totals():
+    return (
+        ShoppingListItem.objects
+        .values_list('user_id', 'ingredient_id', 'total_amount')
+        .order_by('user_id', 'ingredient_id')
+    )
+
+
+def diff(live, stored):
+    """Сравнивает две отсортированные по ключу последовательности строк."""
+    live, stored = iter(live), iter(stored)
+    left, right = next(live, None), next(stored, None)
+    while left is not None or right is not None:
+        if right is None or (left is not None and left[:2] < right[:2]):
+            yield left[:2], left[2], None
+            left = next(live, None)
+        elif left is None or right[:2] < left[:2]:
+            yield right[:2], None, right[2]
+            right = next(stored, None)
+        else:
+            if left[2] != right[2]:
+                yield left[:2], left[2], right[2]
+            left, right = next(live, None), next(stored, None)
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild shopping list aggregates from shopping carts '
+        'or verify that they match.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare aggregates with carts, do not write.'
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self.verify()
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            rows = live_totals().iterator(chunk_size=BATCH_SIZE)
+            created = 0
+            while True:
+                batch = [
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total_amount
+                    )
+                    for user_id, ingredient_id, total_amount
+                    in islice(rows, BATCH_SIZE)
+                ]
+                if not batch:
+                    break
+                ShoppingListItem.objects.bulk_create(batch)
+                created += len(batch)
+        self.stdout.write(f'Shopping lists rebuilt: {created} rows.')
+
+    def verify(self):
+        mismatches = 0
+        for key, expected, actual in diff(
+            live_totals().iterator(chunk_size=BATCH_SIZE),
+            stored_totals().iterator(chunk_size=BATCH_SIZE)
+        ):
+            mismatches += 1
+            if mismatches <= MAX_REPORTED:
+                self.stdout.write(
+                    'user {} ingredient {}: expected {}, stored {}'.format(
+                        *key, expected, actual
+                    )
+                )
+        if mismatches:
+            raise CommandError(
+                f'{mismatches} shopping list rows do not match carts.'
+            )
+        self.stdout.write('Shopping lists match carts.')
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+# (модель, поле счетчика, связанная модель, FK связанной модели)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+def actual_count(related, field):
+    return Coalesce(
+        Subquery(
+            related.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def drifted(model, counter, related, field):
+    return model.objects.annotate(
+        actual=actual_count(related, field)
+    ).exclude(**{counter: F('actual')})
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate denormalized counters: favorites and cart adds '
+        'of recipes, recipes and followers of users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report drifted counters, do not write.'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        with transaction.atomic():
+            for model, counter, related, field in COUNTERS:
+                rows = drifted(model, counter, related, field)
+                if options['verify']:
+                    changed = rows.count()
+                else:
+                    changed = model.objects.filter(
+                        pk__in=rows.values('pk')
+                    ).update(**{counter: actual_count(related, field)})
+                total += changed
+                self.stdout.write(
+                    f'{model.__name__}.{counter}: {changed} drifted.'
+                )
+        if options['verify'] and total:
+            raise CommandError(f'{total} counters do not match.')
@@ -0,0 +1,75 @@
+# Generated by Django 3.2.16 on 2026-10-18 01:25
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('api', 'Ingredient')
+    RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+    ShoppingCart = apps.get_model('api', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('api', 'ShoppingListItem')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    if not duplicates:
+        return
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        group = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        )
+        rows = {}
+        for row in RecipeIngredient.objects.filter(ingredient__in=group):
+            rows.setdefault(row.recipe_id, []).append(row)
+        for recipe_rows in rows.values():
+            # Рецепт с несколькими дублями: количества складываются в
+            # одну строку, остальные удаляются до каскада.
+            recipe_rows.sort(key=lambda row: row.ingredient_id != keep_id)
+            kept, *merged = recipe_rows
+            if merged:
+                RecipeIngredient.objects.filter(
+                    pk__in=[row.pk for row in merged]
+                ).delete()
+            RecipeIngredient.objects.filter(pk=kept.pk).update(
+                ingredient_id=keep_id,
+                # Не больше MAX_FIELD_NUM из валидатора amount.
+                amount=min(sum(row.amount for row in recipe_rows), 32000)
+            )
+        group.exclude(pk=keep_id).delete()
+    ShoppingListItem.objects.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(**row) for row in (
+            ShoppingCart.objects
+            .filter(recipe__recipes__isnull=False)
+            .values('user_id', ingredient_id=F('recipe__recipes__ingredient'))
+            .annotate(total_amount=Sum('recipe__recipes__amount'))
+            .order_by()
+        )
+    )
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей после удалений не дают
+        # AddConstraint изменить таблицу в той же транзакции.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-18 01:27
+
+from django.db import migrations
+
+PREFIX_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_prefix_idx '
+    'ON api_ingredient (lower(name) text_pattern_ops)'
+)
+TRIGRAM_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_trgm_idx '
+    'ON api_ingredient USING gin (lower(name) gin_trgm_ops)',
+)
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(PREFIX_INDEX_SQL)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            # Без pg_trgm поиск по подстроке работает, но без индекса.
+            return
+    for statement in TRIGRAM_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS api_ingredient_name_trgm_idx')
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS api_ingredient_name_prefix_idx'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+# Составной индекс для фильтра по тегам: EXISTS по tag_id IN (...)
+# сразу получает recipe_id из индекса, не читая таблицу.
+CREATE_INDEX = (
+    'CREATE INDEX api_recipe_tags_tag_recipe_idx '
+    'ON api_recipe_tags (tag_id, recipe_id)'
+)
+DROP_INDEX = 'DROP INDEX api_recipe_tags_tag_recipe_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_recipe_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
@@ -1,7 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
 
+from core.models import CounterFieldsMixin
 from users.models import User
 from api.constants import MAX_FIELD_NUM, MAX_FIELDS_LENGHT, MIN_FIELD_NUM
 
@@ -53,12 +56,18 @@ class Ingredient(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     name = models.CharField(
         'Название рецепта.',
         max_length=MAX_FIELDS_LENGHT
@@ -84,10 +93,26 @@ class Recipe(models.Model):
         blank=True,
         upload_to='recipes/',
     )
+    image_variants = models.JSONField(
+        'Варианты картинки',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -104,11 +129,30 @@ class Recipe(models.Model):
         Tag,
         verbose_name='Теги'
     )
+    # Ведется только на Postgres: api.search.update_search_vectors
+    # вызывается при сохранении рецепта и изменении его ингредиентов.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    counter_fields = ('favorites_count', 'cart_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['cooking_time', '-pub_date', '-id'],
+                name='recipe_quickest_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -210,3 +254,147 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingListItemManager(models.Manager):
+    def _recipe_amounts(self, recipe_id):
+        return dict(
+            RecipeIngredient.objects
+            .filter(recipe_id=recipe_id)
+            .values_list('ingredient_id', 'amount')
+        )
+
+    @transaction.atomic(savepoint=False)
+    def add_recipe(self, user_id, recipe_id):
+        """Прибавляет ингредиенты рецепта к списку покупок пользователя."""
+        amounts = self._recipe_amounts(recipe_id)
+        if not amounts:
+            return
+        items = list(
+            self.select_for_update()
+            .filter(user_id=user_id, ingredient_id__in=amounts)
+        )
+        for item in items:
+            item.total_amount = (
+                F('total_amount') + amounts.pop(item.ingredient_id)
+            )
+        self.bulk_update(items, ['total_amount'])
+        self.bulk_create(
+            [self.model(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=amount
+            ) for ingredient_id, amount in amounts.items()]
+        )
+
+    @transaction.atomic(savepoint=False)
+    def remove_recipe(self, user_id, recipe_id):
+        """Вычитает ингредиенты рецепта из списка покупок пользователя."""
+        amounts = self._recipe_amounts(recipe_id)
+        if not amounts:
+            return
+        items = list(
+            self.select_for_update()
+            .filter(user_id=user_id, ingredient_id__in=amounts)
+        )
+        for item in items:
+            item.total_amount = (
+                F('total_amount') - amounts[item.ingredient_id]
+            )
+        self.bulk_update(items, ['total_amount'])
+        self.filter(user_id=user_id, total_amount__lte=0).delete()
+
+    def refresh(self, users, ingredients):
+        """Пересчитывает строки списка по текущему содержимому корзин.
+
+        Затрагиваются только пары из указанных пользователей и
+        ингредиентов, поэтому метод подходит для изменений рецепта,
+        который лежит в корзинах у многих пользователей.
+        """
+        self.filter(user__in=users, ingredient__in=ingredients).delete()
+        self.bulk_create(self.model(**row) for row in (
+            ShoppingCart.objects
+            .filter(
+                user__in=users,
+                recipe__recipes__ingredient__in=ingredients
+            )
+            .values('user_id', ingredient_id=F('recipe__recipes__ingredient'))
+            .annotate(total_amount=Sum('recipe__recipes__amount'))
+            .order_by()
+        ))
+
+    def refresh_carts(self, recipes, ingredients):
+        """refresh для всех, у кого рецепты recipes лежат в корзине."""
+        users = list(
+            ShoppingCart.objects.filter(recipe__in=recipes)
+            .values_list('user', flat=True).distinct()
+        )
+        if users:
+            self.refresh(users, ingredients)
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField('Общее количество')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.user.username} - {self.ingredient.name}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Записи создаются при публикации рецепта для каждого подписчика
+    автора (см. api/feed.py).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
@@ -1,5 +1,254 @@
+import asyncio
+import base64
+import json
+from collections import OrderedDict
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.async_views import run_in_thread
+
+FALSE_VALUES = ('false', '0', 'no')
+
+
+def keyset_filter(fields, values, reverse=False):
+    """Условие «строго после позиции» для сортировки по нескольким полям.
+
+    Для ('-pub_date', '-id') это pub_date < d OR (pub_date = d AND id < i),
+    что Postgres выполняет по составному индексу без OFFSET.
+    """
+    condition = Q()
+    for index, field in enumerate(fields):
+        descending = field.startswith('-') != reverse
+        lookup = 'lt' if descending else 'gt'
+        step = Q(**{f'{field.lstrip("-")}__{lookup}': values[index]})
+        for previous, value in zip(fields[:index], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
 
 
 class FoodgramPagination(PageNumberPagination):
+    """Постраничная пагинация с двумя необязательными режимами.
+
+    ?cursor= включает курсорную пагинацию по полям view.cursor_fields
+    (пустое значение — первая страница), ?count=false отключает
+    COUNT(*) и убирает count из ответа. Без этих параметров ответ
+    такой же, как у PageNumberPagination.
+    """
+
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.links = None
+        self.with_count = request.query_params.get(
+            self.count_query_param, ''
+        ).lower() not in FALSE_VALUES
+        cursor_fields = getattr(view, 'cursor_fields', None)
+        if cursor_fields and self.cursor_query_param in request.query_params:
+            return self.paginate_by_cursor(queryset, request, cursor_fields)
+        if self.with_count:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_without_count(queryset, request)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных видов.
+
+        В обычном постраничном режиме COUNT(*) и строки страницы
+        запрашиваются одновременно в разных потоках: номер страницы
+        проверяется уже после обоих запросов. Остальные режимы и
+        некорректные номера страниц обрабатывает paginate_queryset.
+        """
+        page_size = self.get_page_size(request)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        cursor_fields = getattr(view, 'cursor_fields', None)
+        try:
+            number = int(page_number)
+        except (TypeError, ValueError):
+            number = 0
+        if (
+            not page_size or number < 1
+            or (cursor_fields and self.cursor_query_param
+                in request.query_params)
+            or request.query_params.get(
+                self.count_query_param, ''
+            ).lower() in FALSE_VALUES
+        ):
+            return await run_in_thread(
+                self.paginate_queryset, queryset, request, view
+            )
+        self.request = request
+        self.links = None
+        self.with_count = True
+        paginator = self.django_paginator_class(queryset, page_size)
+        offset = (number - 1) * page_size
+        paginator.count, rows = await asyncio.gather(
+            run_in_thread(queryset.count),
+            run_in_thread(list, queryset[offset:offset + page_size])
+        )
+        try:
+            paginator.validate_number(number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return rows
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            page_number = int(page_number)
+            if page_number < 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_page_message)
+        offset = (page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if page_number > 1 and not rows:
+            raise NotFound(self.invalid_page_message)
+        url = request.build_absolute_uri()
+        next_link = previous_link = None
+        if len(rows) > page_size:
+            next_link = replace_query_param(
+                url, self.page_query_param, page_number + 1
+            )
+        if page_number == 2:
+            previous_link = remove_query_param(url, self.page_query_param)
+        elif page_number > 2:
+            previous_link = replace_query_param(
+                url, self.page_query_param, page_number - 1
+            )
+        self.links = (next_link, previous_link)
+        return rows[:page_size]
+
+    def paginate_by_cursor(self, queryset, request, fields):
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(
+            self.get_cursor_model(queryset), fields,
+            request.query_params.get(self.cursor_query_param, '')
+        )
+        self.count = queryset.count() if self.with_count else None
+        rows = self.fetch_rows(
+            queryset, fields, position, reverse, page_size + 1
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        next_link = previous_link = None
+        if rows and (has_more or reverse):
+            next_link = self.encode_cursor(fields, rows[-1], False)
+        if rows and (has_more if reverse else position is not None):
+            previous_link = self.encode_cursor(fields, rows[0], True)
+        self.links = (next_link, previous_link)
+        return rows
+
+    def get_cursor_model(self, queryset):
+        return queryset.model
+
+    def fetch_rows(self, queryset, fields, position, reverse, limit):
+        """Первые limit строк после позиции в порядке обхода."""
+        ordering = fields
+        if reverse:
+            ordering = [
+                field.lstrip('-') if field.startswith('-') else f'-{field}'
+                for field in fields
+            ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                keyset_filter(fields, position, reverse)
+            )
+        return list(queryset[:limit])
+
+    def decode_cursor(self, model, fields, cursor):
+        if not cursor:
+            return False, None
+        try:
+            direction, *values = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+            if direction not in ('n', 'p') or len(values) != len(fields):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'p', position
+
+    def encode_cursor(self, fields, row, reverse):
+        values = []
+        for field in fields:
+            value = getattr(row, field.lstrip('-'))
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(['p' if reverse else 'n', *values]).encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param, cursor
+        )
+
+    def get_paginated_response(self, data):
+        if self.links is None:
+            return super().get_paginated_response(data)
+        next_link, previous_link = self.links
+        response = OrderedDict()
+        if self.with_count:
+            response['count'] = self.count
+        response['next'] = next_link
+        response['previous'] = previous_link
+        response['results'] = data
+        return Response(response)
+
+
+class FeedPagination(FoodgramPagination):
+    """Курсорная пагинация по объединению нескольких выборок.
+
+    Вместо queryset принимает список querysets одной модели: из каждой
+    берется страница после курсора, строки сливаются по
+    view.cursor_fields без повторов. Курсор включен всегда, count
+    не считается.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.with_count = False
+        return self.paginate_by_cursor(queryset, request, view.cursor_fields)
+
+    def get_cursor_model(self, queryset):
+        return queryset[0].model
+
+    def fetch_rows(self, queryset, fields, position, reverse, limit):
+        rows = {}
+        for part in queryset:
+            for row in super().fetch_rows(
+                part, fields, position, reverse, limit
+            ):
+                rows[row.pk] = row
+        rows = list(rows.values())
+        # Устойчивая сортировка с последнего поля до первого.
+        for field in reversed(fields):
+            rows.sort(
+                key=attrgetter(field.lstrip('-')),
+                reverse=field.startswith('-') != reverse
+            )
+        return rows[:limit]
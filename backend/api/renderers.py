@@ -0,0 +1,352 @@
+import csv
+import json
+import re
+import struct
+import textwrap
+import zlib
+from abc import ABCMeta, abstractmethod
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from PIL import ImageFont
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from api.constants import (PDF_FONT_SIZE, PDF_LINE_WIDTH, PDF_LINES_PER_PAGE,
+                           SHOPPING_LIST_TITLE)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_ESCAPES = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+# Дробное число в компактном JSON: после начала, [, или : и перед , ] }.
+# Внутри строки такое встречается редко и дает лишь лишний откат
+# на JSONRenderer.
+JSON_FLOAT = re.compile(
+    rb'(?:^|[\[,:])-?\d+(?:\.\d+(?:e-?\d+)?|e-?\d+)(?=[,\]}]|$)'
+)
+
+# Встроенный в PDF шрифт: подмножество DejaVu Sans с латиницей и
+# кириллицей (сделано pyftsubset, лицензия в fonts/LICENSE).
+PDF_FONT_FILE = Path(__file__).resolve().parent / 'fonts' / 'DejaVuSans.ttf'
+PDF_FONT_NAME = b'DejaVuSans'
+# Коды 128-193 однобайтовой кодировки шрифта перекодированы на
+# кириллицу через /Differences, 32-126 остаются ASCII.
+CYRILLIC_GLYPHS = (
+    [(0x410 + i, f'afii{10017 + i}') for i in range(6)]
+    + [(0x401, 'afii10023')]
+    + [(0x416 + i, f'afii{10024 + i}') for i in range(26)]
+    + [(0x430 + i, f'afii{10065 + i}') for i in range(6)]
+    + [(0x451, 'afii10071')]
+    + [(0x436 + i, f'afii{10072 + i}') for i in range(26)]
+)
+PDF_ENCODING = {
+    chr(char): 128 + code for code, (char, _) in enumerate(CYRILLIC_GLYPHS)
+}
+PDF_FIRST_CHAR = 32
+PDF_LAST_CHAR = 127 + len(CYRILLIC_GLYPHS)
+PDF_SUBSTITUTES = {'«': '"', '»': '"', '№': 'N', '–': '-', '—': '-'}
+
+
+def read_font_bbox(data):
+    """FontBBox из таблицы head шрифта в единицах 1/1000 em."""
+    tables = struct.unpack_from('>H', data, 4)[0]
+    for index in range(tables):
+        tag, _, offset, _ = struct.unpack_from(
+            '>4sIII', data, 12 + 16 * index
+        )
+        if tag == b'head':
+            units = struct.unpack_from('>H', data, offset + 18)[0]
+            return [
+                round(value * 1000 / units)
+                for value in struct.unpack_from('>4h', data, offset + 36)
+            ]
+    raise ValueError('В шрифте нет таблицы head.')
+
+
+def pdf_stream(content, **entries):
+    """Тело объекта-потока PDF, сжатого Flate."""
+    content = zlib.compress(content)
+    extra = b''.join(
+        b' /%s %s' % (key.encode(), value) for key, value in entries.items()
+    )
+    return (
+        b'<< /Length %d /Filter /FlateDecode%s >>\nstream\n%s\nendstream'
+        % (len(content), extra, content)
+    )
+
+
+def to_unicode_cmap():
+    """CMap ToUnicode: текст из PDF можно искать и копировать."""
+    chars = ''.join(
+        f'<{128 + code:02X}> <{char:04X}>\n'
+        for code, (char, _) in enumerate(CYRILLIC_GLYPHS)
+    )
+    return (
+        '/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n'
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        '/Supplement 0 >> def\n/CMapName /Adobe-Identity-UCS def\n'
+        '/CMapType 2 def\n1 begincodespacerange\n<00> <FF>\n'
+        'endcodespacerange\n1 beginbfrange\n<20> <7E> <0020>\n'
+        f'endbfrange\n{len(CYRILLIC_GLYPHS)} beginbfchar\n{chars}'
+        'endbfchar\nendcmap\nCMapName currentdict /CMap defineresource '
+        'pop\nend\nend'
+    ).encode()
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font_objects():
+    """Тела объектов шрифта: словарь, кодировка, дескриптор, ToUnicode
+    и файл шрифта. Строятся один раз на процесс.
+    """
+    data = PDF_FONT_FILE.read_bytes()
+    font = ImageFont.truetype(BytesIO(data), 1000)
+    chars = [chr(code) for code in range(PDF_FIRST_CHAR, 127)]
+    chars += ['\x00'] + [chr(char) for char, _ in CYRILLIC_GLYPHS]
+    widths = [
+        0 if char == '\x00' else round(font.getlength(char))
+        for char in chars
+    ]
+    ascent, descent = font.getmetrics()
+    return (
+        b'<< /Type /Font /Subtype /TrueType /BaseFont /%s '
+        b'/FirstChar %d /LastChar %d /Widths [%s] /Encoding 4 0 R '
+        b'/FontDescriptor 5 0 R /ToUnicode 6 0 R >>' % (
+            PDF_FONT_NAME, PDF_FIRST_CHAR, PDF_LAST_CHAR,
+            b' '.join(b'%d' % width for width in widths)
+        ),
+        b'<< /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+        b'/Differences [128 %s] >>' % ' '.join(
+            '/' + glyph for _, glyph in CYRILLIC_GLYPHS
+        ).encode(),
+        b'<< /Type /FontDescriptor /FontName /%s /Flags 32 '
+        b'/FontBBox [%s] /ItalicAngle 0 /Ascent %d /Descent %d '
+        b'/CapHeight %d /StemV 80 /FontFile2 7 0 R >>' % (
+            PDF_FONT_NAME,
+            b' '.join(b'%d' % value for value in read_font_bbox(data)),
+            ascent, -descent, ascent
+        ),
+        pdf_stream(to_unicode_cmap()),
+        pdf_stream(data, Length1=b'%d' % len(data)),
+    )
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson, если он установлен.
+
+    Байты ответа те же, что у JSONRenderer с настройками проекта:
+    компактные разделители, UTF-8 без \\u-экранирования, кроме
+    U+2028/U+2029, нестандартные типы — через кодировщик DRF. Ответы
+    с отступом (Accept: application/json; indent=4) и данные, которые
+    orjson не кодирует (например, целые больше 64 бит), рендерит
+    JSONRenderer. Дробные числа orjson записывает иначе, чем json
+    (1e20 вместо 1e+20, 0.00001 вместо 1e-05), поэтому ответы с ними
+    тоже рендерит JSONRenderer. NaN и бесконечность orjson пишет
+    как null, а JSONRenderer в строгом режиме отвергает; в моделях
+    API таких значений нет.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None
+            or self.ensure_ascii or not self.compact
+            or self.get_indent(
+                accepted_media_type, renderer_context or {}
+            ) is not None
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            # Даты в формате DRF (Z вместо +00:00, миллисекунды) дает
+            # encoder_class.default, ключи-числа (ошибки ListField)
+            # становятся строками, как в json.
+            content = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=(
+                    orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME
+                    | orjson.OPT_PASSTHROUGH_DATACLASS
+                )
+            )
+        except orjson.JSONEncodeError:
+            content = None
+        if content is None or JSON_FLOAT.search(content):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        for character, escaped in JSON_ESCAPES:
+            if character in content:
+                content = content.replace(character, escaped)
+        return content
+
+
+class ShoppingListRenderer(BaseRenderer, metaclass=ABCMeta):
+    """Базовый класс потоковых форматов списка покупок.
+
+    Строки списка приходят кортежами (название, количество, единица)
+    и отдаются клиенту по частям через stream(). Через render() проходят
+    только ответы с ошибками, они отдаются как JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode()
+
+    @abstractmethod
+    def stream(self, rows):
+        """Итератор байтов файла со строками rows."""
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield SHOPPING_LIST_TITLE.encode()
+        for row in rows:
+            yield '\n{} - {} {}.'.format(*row).encode()
+
+
+class EchoBuffer:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(
+            ('name', 'amount', 'measurement_unit')
+        ).encode()
+        for row in rows:
+            yield writer.writerow(row).encode()
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = '['
+        for name, amount, measurement_unit in rows:
+            yield (separator + json.dumps(
+                {
+                    'name': name,
+                    'amount': amount,
+                    'measurement_unit': measurement_unit
+                },
+                ensure_ascii=False
+            )).encode()
+            separator = ','
+        yield b'[]' if separator == '[' else b']'
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """PDF, который пишется постранично по мере чтения строк.
+
+    В памяти держится только текущая страница и смещения объектов,
+    нужные для таблицы xref в конце файла. Шрифт с кириллицей
+    встраивается в файл, так что текст не зависит от шрифтов программы
+    просмотра.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, rows):
+        offsets = {}
+        kids = []
+        position = 0
+
+        def write_object(number, body):
+            nonlocal position
+            offsets[number] = position
+            chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+            position += len(chunk)
+            return chunk
+
+        header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        position += len(header)
+        yield header
+        yield write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        for number, body in enumerate(get_pdf_font_objects(), start=3):
+            yield write_object(number, body)
+        next_number = 8
+        for page in self.paginate(self.lines(rows)):
+            content = self.page_content(page)
+            yield write_object(next_number, b'<< /Length %d >>\nstream\n%s'
+                               b'\nendstream' % (len(content), content))
+            yield write_object(next_number + 1, (
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                b'/Resources << /Font << /F1 3 0 R >> >> '
+                b'/Contents %d 0 R >>' % next_number
+            ))
+            kids.append(next_number + 1)
+            next_number += 2
+        yield write_object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)
+        ))
+        xref = [b'xref\n0 %d\n0000000000 65535 f \n' % next_number]
+        xref.extend(
+            b'%010d 00000 n \n' % offsets[number]
+            for number in range(1, next_number)
+        )
+        yield b''.join(xref)
+        yield (
+            b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (next_number, position)
+        )
+
+    def lines(self, rows):
+        yield SHOPPING_LIST_TITLE
+        for row in rows:
+            yield from textwrap.wrap(
+                '{} - {} {}.'.format(*row), PDF_LINE_WIDTH
+            )
+
+    def paginate(self, lines):
+        page = []
+        for line in lines:
+            page.append(line)
+            if len(page) == PDF_LINES_PER_PAGE:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def page_content(self, page):
+        content = [b'BT /F1 %d Tf %d TL 50 800 Td' % (
+            PDF_FONT_SIZE, PDF_FONT_SIZE + 4
+        )]
+        for line in page:
+            content.append(b'(%s) Tj T*' % self.encode_line(line))
+        content.append(b'ET')
+        return b'\n'.join(content)
+
+    def encode_line(self, line):
+        encoded = bytearray()
+        for char in line:
+            char = PDF_SUBSTITUTES.get(char, char)
+            code = ord(char)
+            if char in PDF_ENCODING:
+                encoded.append(PDF_ENCODING[char])
+            elif 32 <= code < 127:
+                if char in '()\\':
+                    encoded.append(ord('\\'))
+                encoded.append(code)
+            else:
+                encoded.append(ord('?'))
+        return bytes(encoded)
@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import NotSupportedError, connection
+from django.db.models import (Case, F, IntegerField, OuterRef, Subquery, Value,
+                              When)
+from django.db.models.functions import Coalesce
+
+from api.constants import (DEFAULT_RECIPE_ORDERING, RECIPE_ORDERINGS,
+                           SEARCH_CONFIG)
+from api.models import RecipeIngredient
+
+
+def search_vector():
+    """Вектор рецепта: название (A), ингредиенты (B), описание (C)."""
+    ingredients = Subquery(
+        RecipeIngredient.objects
+        .filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(ingredients, Value('')),
+            weight='B', config=SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    """Пересчитывает search_vector рецептов одним UPDATE.
+
+    Колонка ведется только на Postgres, на остальных базах поиск
+    работает без нее (см. search_recipes).
+    """
+    if connection.vendor != 'postgresql':
+        return 0
+    return queryset.order_by().update(search_vector=search_vector())
+
+
+def match_in_process(queryset, text):
+    """Ранги подходящих рецептов: 3 — слово в названии, 2 — в
+    ингредиентах, 1 — только в описании.
+
+    Запасной вариант для тестовой SQLite: LIKE в ней не различает
+    регистр только для латиницы, поэтому сравнение идет в Python
+    через casefold. Читает все рецепты выборки, поэтому годится
+    только для тестовых объемов.
+    """
+    words = text.casefold().split()
+    ingredients = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.filter(
+        recipe__in=queryset.order_by().values('pk')
+    ).values_list('recipe_id', 'ingredient__name'):
+        ingredients[recipe_id].append(name.casefold())
+    ranks = {}
+    for pk, name, body in queryset.values_list('pk', 'name', 'text'):
+        fields = (
+            (3, name.casefold()),
+            (2, ' '.join(ingredients[pk])),
+            (1, body.casefold()),
+        )
+        if all(any(word in field for _, field in fields) for word in words):
+            ranks[pk] = max(
+                rank for rank, field in fields
+                if any(word in field for word in words)
+            )
+    return ranks
+
+
+def search_recipes(queryset, text):
+    """Рецепты, подходящие под все слова запроса, от самых релевантных.
+
+    На Postgres — websearch-запрос по search_vector (GIN-индекс) с
+    SearchRank, на тестовой SQLite (IS_TEST_DB) — match_in_process.
+    """
+    tail = RECIPE_ORDERINGS[DEFAULT_RECIPE_ORDERING]
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', *tail)
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError(
+            f'Recipe search is not supported on {connection.vendor}.'
+        )
+    ranks = match_in_process(queryset, text)
+    return queryset.filter(pk__in=ranks).annotate(search_rank=Case(
+        *[
+            When(pk__in=[pk for pk in ranks if ranks[pk] == rank],
+                 then=Value(rank))
+            for rank in (3, 2)
+        ],
+        default=Value(1),
+        output_field=IntegerField()
+    )).order_by('-search_rank', *tail)
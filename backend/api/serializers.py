@@ -1,11 +1,25 @@
+import json
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
 from django.db import transaction
+from django.db.models import (F, Manager, Prefetch, QuerySet, Window,
+                              prefetch_related_objects)
+from django.db.models.functions import RowNumber
+from django.http import QueryDict
+from django.utils.functional import cached_property
 from djoser.serializers import UserSerializer
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
 from users.models import User
-from api.models import Ingredient, Recipe, RecipeIngredient, Tag
-from api.constants import MAX_FIELD_NUM, MIN_FIELD_NUM
+from api.models import (Ingredient, Recipe, RecipeIngredient, ShoppingListItem,
+                        Tag)
+from api.constants import (BULK_MAX_IDS, MAX_FIELD_NUM, MIN_FIELD_NUM,
+                           RECIPE_PREVIEW_FIELDS)
+from api.images import schedule_image_variants
+from api.search import update_search_vectors
 
 
 class UsersSerializer(UserSerializer):
@@ -29,6 +43,8 @@ class UsersSerializer(UserSerializer):
         }
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not (
             request
@@ -50,20 +66,130 @@ class UsersSerializer(UserSerializer):
         return user
 
 
+class ValuesListSerializer(serializers.ListSerializer):
+    """Список объектов без построчной работы сериализатора.
+
+    Если все поля дочернего ModelSerializer — обычные поля модели
+    (в том числе через обязательные ForeignKey, как ingredient.name),
+    словари собираются напрямую: из .values_list() для еще не
+    выполненного QuerySet и из атрибутов для загруженных объектов
+    (например, из prefetch_related). Значения проходят через
+    to_representation полей, поэтому ответ тот же, что у
+    ListSerializer. Иначе работает обычный ListSerializer.
+    """
+
+    @cached_property
+    def plain_fields(self):
+        """Поля для быстрого пути или None, если он недоступен."""
+        child = self.child
+        if (
+            type(child).to_representation
+            is not serializers.Serializer.to_representation
+        ):
+            return None
+        fields = []
+        for field in child._readable_fields:
+            if not field.source_attrs:
+                return None
+            model = child.Meta.model
+            try:
+                for attr in field.source_attrs[:-1]:
+                    relation = model._meta.get_field(attr)
+                    if not relation.many_to_one or relation.null:
+                        return None
+                    model = relation.related_model
+                model_field = model._meta.get_field(field.source_attrs[-1])
+            except FieldDoesNotExist:
+                return None
+            if model_field.is_relation or not model_field.concrete:
+                return None
+            path = [*field.source_attrs[:-1], model_field.attname]
+            fields.append(
+                (field, '__'.join(path), '.'.join(path), model_field)
+            )
+        return fields
+
+    def to_representation(self, data):
+        fields = self.plain_fields
+        if fields is None:
+            return super().to_representation(data)
+        if isinstance(data, Manager):
+            data = data.all()
+        names = [field.field_name for field, *_ in fields]
+        if (
+            isinstance(data, QuerySet) and data._result_cache is None
+            and not data.query.combinator
+        ):
+            converters = [
+                self.file_converter(field, model_field)
+                if isinstance(field, serializers.FileField)
+                else field.to_representation
+                for field, _, _, model_field in fields
+            ]
+            rows = data.prefetch_related(None).values_list(
+                *[lookup for _, lookup, _, _ in fields]
+            )
+        else:
+            converters = [field.to_representation for field, *_ in fields]
+            getter = attrgetter(*[attribute for _, _, attribute, _ in fields])
+            if len(fields) == 1:
+                rows = ((getter(item),) for item in data)
+            else:
+                rows = map(getter, data)
+        return [
+            {
+                name: None if value is None else convert(value)
+                for name, convert, value in zip(names, converters, row)
+            }
+            for row in rows
+        ]
+
+    def file_converter(self, field, model_field):
+        """Имя файла из values_list -> то же, что для атрибута модели."""
+        def convert(name):
+            return field.to_representation(
+                model_field.attr_class(None, model_field, name)
+            )
+        return convert
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = '__all__'
+        list_serializer_class = ValuesListSerializer
 
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
+        list_serializer_class = ValuesListSerializer
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Варианты картинки: размеры и абсолютные ссылки для srcset.
+
+    Пока фоновая обработка не закончилась, возвращается пустой словарь.
+    """
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        representation = {}
+        for variant, description in value.items():
+            representation[variant] = {}
+            for key, item in description.items():
+                if isinstance(item, str):
+                    item = default_storage.url(item)
+                    if request is not None:
+                        item = request.build_absolute_uri(item)
+                representation[variant][key] = item
+        return representation
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(read_only=True)
+    image_variants = ImageVariantsField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
@@ -71,8 +197,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'name',
-            'image', 'cooking_time'
+            'image', 'image_variants', 'cooking_time'
         )
+        list_serializer_class = ValuesListSerializer
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -88,6 +215,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
             'id', 'name',
             'measurement_unit', 'amount'
         )
+        list_serializer_class = ValuesListSerializer
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -109,6 +237,7 @@ class MainRecipeSerializer(serializers.ModelSerializer):
         read_only=True, many=True, source='recipes'
     )
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -116,13 +245,20 @@ class MainRecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'tags',
-            'name', 'image',
+            'name', 'image', 'image_variants',
             'text', 'cooking_time',
             'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -133,6 +269,8 @@ class MainRecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -165,35 +303,69 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'cooking_time', 'author'
         )
 
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            data = self.parse_multipart(data)
+        return super().to_internal_value(data)
+
+    def parse_multipart(self, data):
+        """Приводит multipart/form-data к виду JSON-запроса.
+
+        Картинка приходит файлом, теги — повторяющимся полем tags,
+        ингредиенты — JSON-строкой в поле ingredients.
+        """
+        parsed = data.dict()
+        if 'tags' in data:
+            parsed['tags'] = data.getlist('tags')
+        if 'ingredients' in data:
+            try:
+                parsed['ingredients'] = json.loads(data['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'ingredients': ['Ожидается JSON-список ингредиентов.']}
+                )
+        return parsed
+
     def validate(self, obj):
         # Без этой проверки запросы подают с ошибкой 500
         for field in [
             'name', 'text', 'cooking_time', 'ingredients', 'tags', 'image'
         ]:
+            # PATCH может не передавать поле, тогда оно не меняется.
+            if self.partial and field not in obj:
+                continue
             if not obj.get(field):
                 raise serializers.ValidationError(
                     f'{field} - обязательное поле.'
                 )
-        inrgedients_id_list = [item['id'] for item in obj.get('ingredients')]
-        for id in inrgedients_id_list:
-            if not Ingredient.objects.filter(
-                pk=id
-            ).exists():
+        if 'ingredients' in obj:
+            self.check_ingredients(obj['ingredients'])
+        if 'tags' in obj:
+            tags_list = obj['tags']
+            if len(tags_list) != len(set(tags_list)):
                 raise serializers.ValidationError(
-                    'Ингредиента не существует.'
+                    'Теги не должны повторяться.'
+                )
+        return obj
+
+    def check_ingredients(self, ingredients):
+        inrgedients_id_list = [item['id'] for item in ingredients]
+        missing_ingredients = set(inrgedients_id_list) - set(
+            Ingredient.objects.filter(
+                pk__in=inrgedients_id_list
+            ).values_list('pk', flat=True)
+        )
+        if missing_ingredients:
+            raise serializers.ValidationError(
+                'Ингредиента не существует: {}.'.format(
+                    ', '.join(map(str, sorted(missing_ingredients)))
                 )
+            )
         unique_ingredients_id_list = set(inrgedients_id_list)
         if len(inrgedients_id_list) != len(unique_ingredients_id_list):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться.'
             )
-        tags_list = obj.get('tags')
-        unique_tags_list = set(tags_list)
-        if len(tags_list) != len(unique_tags_list):
-            raise serializers.ValidationError(
-                'Теги не должны повторяться.'
-            )
-        return obj
 
     @transaction.atomic
     def create_tags_and_ingredients(self, recipe, tags, ingredients):
@@ -202,7 +374,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             [RecipeIngredient(
                 recipe=recipe,
                 amount=ingredient.get('amount'),
-                ingredient=Ingredient.objects.get(pk=ingredient.get('id')),
+                ingredient_id=ingredient.get('id'),
             ) for ingredient in ingredients]
         )
 
@@ -215,36 +387,127 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             **validated_data
         )
         self.create_tags_and_ingredients(recipe, tags, ingredients)
+        # post_save сработал до ингредиентов, пересчитываем вектор с ними.
+        update_search_vectors(Recipe.objects.filter(pk=recipe.pk))
+        schedule_image_variants(recipe)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        amounts = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        changed, removed = [], []
+        for recipe_ingredient in recipe.recipes.all():
+            amount = amounts.pop(recipe_ingredient.ingredient_id, None)
+            if amount is None:
+                removed.append(recipe_ingredient)
+            elif amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if removed:
+            # Удаленные строки убирают из списков покупок сигналы,
+            # остальные изменения пересчитывает update().
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in removed]
+            ).delete()
+        if amounts:
+            RecipeIngredient.objects.bulk_create(
+                [RecipeIngredient(
+                    recipe=recipe,
+                    amount=amount,
+                    ingredient_id=ingredient_id,
+                ) for ingredient_id, amount in amounts.items()]
+            )
+        return {item.ingredient_id for item in changed} | set(amounts)
+
     @transaction.atomic
     def update(self, instance, validated_data):
         instance.text = validated_data.get('text', instance.text)
         instance.name = validated_data.get('name', instance.name)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
-        instance.image = validated_data.get('image', instance.image)
-        instance.recipes.filter(
-            recipe=instance,
-            ingredient__in=instance.ingredients.all()).delete()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        self.create_tags_and_ingredients(instance, tags, ingredients)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.image_variants = {}
+        # set() сам вычисляет разницу и не трогает неизменившиеся теги.
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        if 'ingredients' in validated_data:
+            changed_ingredients = self.update_ingredients(
+                instance, validated_data.pop('ingredients')
+            )
+            if changed_ingredients:
+                ShoppingListItem.objects.refresh_carts(
+                    [instance], changed_ingredients
+                )
         instance.save()
+        if 'image' in validated_data:
+            schedule_image_variants(instance)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipes',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
         return MainRecipeSerializer(
             instance,
             context=self.context
         ).data
 
 
+class SubscribingListSerializer(serializers.ListSerializer):
+    """Загружает превью рецептов для всей страницы авторов разом."""
+
+    def to_representation(self, data):
+        authors = list(data)
+        # author__in=[] не превращается в SQL: sql_with_params() бросает
+        # EmptyResultSet.
+        if not authors:
+            return []
+        recipes_limit = self.child.get_recipes_limit()
+        # Только колонки превью: SELECT * внешнего запроса берет их
+        # из подзапроса.
+        recipes = (
+            Recipe.objects
+            .filter(author__in=authors)
+            .only(*RECIPE_PREVIEW_FIELDS)
+            .order_by()
+            .annotate(preview_rank=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc())
+            ))
+        )
+        sql, params = recipes.query.sql_with_params()
+        where = ''
+        if recipes_limit is not None:
+            where = ' WHERE ranked.preview_rank <= %s'
+            params = (*params, recipes_limit)
+        previews = {author.pk: [] for author in authors}
+        for recipe in Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked{where} '
+            'ORDER BY ranked.author_id, ranked.preview_rank',
+            params
+        ):
+            previews[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recipes_preview = previews[author.pk]
+        return super().to_representation(authors)
+
+
 class SubscribingSerializer(serializers.ModelSerializer):
     username = serializers.ReadOnlyField()
     email = serializers.ReadOnlyField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -253,9 +516,7 @@ class SubscribingSerializer(serializers.ModelSerializer):
             'email', 'id', 'username', 'first_name', 'last_name',
             'is_subscribed', 'recipes', 'recipes_count'
         )
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        list_serializer_class = SubscribingListSerializer
 
     def validate(self, obj):
         user = self.context['request'].user
@@ -265,12 +526,20 @@ class SubscribingSerializer(serializers.ModelSerializer):
             )
         return obj
 
+    def get_recipes_limit(self):
+        recipes_limit = self.context['request'].GET.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            return int(recipes_limit)
+        return None
+
     def get_recipes(self, obj):
-        request = self.context['request']
-        recipes = obj.recipes.all()
-        recipes_limit = request.GET.get('recipes_limit')
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = self.get_recipes_limit()
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = RecipeSerializer(
             recipes,
             read_only=True,
@@ -279,6 +548,8 @@ class SubscribingSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context['request']
 
         if not (
@@ -288,3 +559,15 @@ class SubscribingSerializer(serializers.ModelSerializer):
             return False
         user = request.user
         return user.subscriber.filter(author=obj).exists()
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_IDS
+    )
+
+    def validate_ids(self, value):
+        # Повторы убираем, порядок сохраняем для ответа.
+        return list(dict.fromkeys(value))
@@ -0,0 +1,209 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from api.cache import bump_version, invalidate_recipes
+from api.feed import backfill, fan_out, followers_lost, forget
+from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                        ShoppingCart, ShoppingListItem, Tag)
+from api.search import update_search_vectors
+from users.models import Subscribe, User
+
+# Поля автора, которые видны в ответах с рецептами.
+AUTHOR_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(
+            Recipe.objects.filter(recipes__ingredient=instance)
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_recipes(list(
+            sender.objects.filter(tag=instance)
+            .values_list('recipe_id', flat=True)
+        ))
+    else:
+        invalidate_recipes(pk_set)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    # Например, вход обновляет только last_login: автор в ответах тот же.
+    if created or (update_fields and AUTHOR_FIELDS.isdisjoint(update_fields)):
+        return
+    recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    if recipe_ids:
+        invalidate_recipes(recipe_ids)
+
+
+def shift_counter(model, pk, field, delta):
+    """Меняет счетчик одним UPDATE с F(), без чтения строки."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        shift_counter(User, instance.author_id, 'recipes_count', 1)
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    shift_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        shift_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    shift_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_created(sender, instance, created, **kwargs):
+    if created:
+        shift_counter(Recipe, instance.recipe_id, 'cart_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_deleted(sender, instance, **kwargs):
+    shift_counter(Recipe, instance.recipe_id, 'cart_count', -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_created(sender, instance, created, **kwargs):
+    if created:
+        shift_counter(User, instance.author_id, 'followers_count', 1)
+        backfill(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_deleted(sender, instance, **kwargs):
+    shift_counter(User, instance.author_id, 'followers_count', -1)
+    forget(instance.user_id, [instance.author_id])
+    followers_lost([instance.author_id])
+
+
+# Список покупок обновляется в той же транзакции, что и корзины и
+# ингредиенты рецептов, откуда бы они ни менялись: API, админка, shell.
+# bulk_create и bulk_update сигналов не отправляют, их вызывающий код
+# обновляет список сам.
+
+@receiver(pre_save, sender=ShoppingCart)
+def cart_changing(sender, instance, **kwargs):
+    # Правка в админке может перенести строку к другому пользователю
+    # или рецепту, а post_save прежних значений не знает.
+    if not instance._state.adding:
+        instance._previous = (
+            ShoppingCart.objects.filter(pk=instance.pk)
+            .values_list('user_id', 'recipe_id').first()
+        )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_saved(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id
+        )
+        return
+    user_id, recipe_id = getattr(instance, '_previous', None) or (
+        instance.user_id, instance.recipe_id
+    )
+    ShoppingListItem.objects.refresh(
+        {user_id, instance.user_id},
+        RecipeIngredient.objects.filter(
+            recipe__in={recipe_id, instance.recipe_id}
+        ).values('ingredient')
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_removed(sender, instance, **kwargs):
+    ShoppingListItem.objects.remove_recipe(
+        instance.user_id, instance.recipe_id
+    )
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_changing(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous = (
+            RecipeIngredient.objects.filter(pk=instance.pk)
+            .values_list('recipe_id', 'ingredient_id').first()
+        )
+
+
+def recipe_ingredients_changed(recipe_ids):
+    update_search_vectors(Recipe.objects.filter(pk__in=recipe_ids))
+    invalidate_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    recipe_id, ingredient_id = getattr(instance, '_previous', None) or (
+        instance.recipe_id, instance.ingredient_id
+    )
+    ShoppingListItem.objects.refresh_carts(
+        {recipe_id, instance.recipe_id},
+        {ingredient_id, instance.ingredient_id}
+    )
+    recipe_ingredients_changed({recipe_id, instance.recipe_id})
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    ShoppingListItem.objects.refresh_carts(
+        [instance.recipe_id], [instance.ingredient_id]
+    )
+    recipe_ingredients_changed([instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """Убирает ингредиенты рецепта из списков покупок до каскада.
+
+    Каскад удаляет корзины и ингредиенты рецепта в произвольном порядке.
+    Если первыми уйдут ингредиенты, cart_removed уже не узнает, что
+    вычитать. Поэтому ингредиенты удаляются здесь, пока корзины на
+    месте: recipe_ingredient_deleted пересчитывает списки по каждому,
+    а корзинам каскада вычитать уже нечего.
+    """
+    if ShoppingCart.objects.filter(recipe=instance).exists():
+        RecipeIngredient.objects.filter(recipe=instance).delete()
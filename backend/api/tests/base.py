@@ -0,0 +1,25 @@
+from rest_framework.test import APITestCase
+
+from api.tests.factories import clear_caches
+
+
+class FoodgramTestCase(APITestCase):
+    """Тест API с чистыми кэшами.
+
+    Если задан authenticate_as, self.client работает от имени
+    пользователя из одноименного атрибута теста.
+    """
+
+    authenticate_as = None
+
+    def setUp(self):
+        clear_caches()
+        if self.authenticate_as:
+            self.client.force_authenticate(
+                getattr(self, self.authenticate_as)
+            )
+
+    def client_for(self, user):
+        client = self.client_class()
+        client.force_authenticate(user)
+        return client
@@ -0,0 +1,51 @@
+from django.core.cache import caches
+
+from api.cache import local_cache
+from api.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+def clear_caches():
+    """Сбрасывает кэши между тестами."""
+    for cache in caches.all():
+        cache.clear()
+    local_cache.clear()
+
+
+def create_user(username, **fields):
+    return User.objects.create(
+        username=username, email=f'{username}@test.local',
+        first_name='Имя', last_name='Фамилия', **fields
+    )
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(
+            name=f'Тег {index}', color=f'#{index:06X}', slug=f'tag{index}'
+        )
+        for index in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {index}', measurement_unit='г'
+        )
+        for index in range(count)
+    ]
+
+
+def create_recipe(author, tags=(), ingredients=(), amount=10, **fields):
+    fields = {
+        'name': 'Рецепт', 'text': 'Текст рецепта.', 'cooking_time': 10,
+        'image': 'recipes/test.png', **fields,
+    }
+    recipe = Recipe.objects.create(author=author, **fields)
+    recipe.tags.set(tags)
+    for ingredient in ingredients:
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=amount
+        )
+    return recipe
@@ -0,0 +1,138 @@
+import asyncio
+import json
+from unittest import mock
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.test import (AsyncRequestFactory, TransactionTestCase,
+                         override_settings)
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api import pagination
+from api.models import Ingredient, Tag
+from api.tests.factories import (clear_caches, create_ingredients,
+                                 create_recipe, create_tags, create_user)
+from api.views import IngredientsViewSet, RecipesViewSet, TagsViewSet
+
+
+def as_views(viewset, actions):
+    """Синхронный и асинхронный вид одного маршрута."""
+    sync_view = viewset.as_view(actions)
+    with override_settings(ASYNC_VIEWS=True):
+        async_view = viewset.as_view(actions)
+    assert asyncio.iscoroutinefunction(async_view)
+    return sync_view, async_view
+
+
+def content(response):
+    if hasattr(response, 'render'):
+        response.render()
+    return response.status_code, json.loads(response.content)
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """Асинхронные виды отвечают так же, как синхронные.
+
+    TransactionTestCase: асинхронные виды читают базу из других
+    потоков со своими соединениями.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('viewer')
+        author = create_user('author')
+        tags = create_tags(3)
+        ingredients = create_ingredients(4)
+        Ingredient.objects.create(name='Молоко', measurement_unit='мл')
+        self.recipes = [
+            create_recipe(
+                author, tags[:index + 1], ingredients[:index + 1],
+                name=f'Рецепт {index}'
+            )
+            for index in range(5)
+        ]
+        self.user.favorite_user.create(recipe=self.recipes[0])
+
+    def compare(self, viewset, actions, path, params=None, user=None,
+                **kwargs):
+        sync_view, async_view = as_views(viewset, actions)
+        # AsyncRequestFactory в Django 3.2 не переносит data в строку
+        # запроса ASGI, поэтому она сразу в пути.
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        sync_request = APIRequestFactory().get(path)
+        async_request = AsyncRequestFactory().get(path)
+        if user is not None:
+            force_authenticate(sync_request, user)
+            force_authenticate(async_request, user)
+        expected = content(sync_view(sync_request, **kwargs))
+        clear_caches()
+        actual = content(async_to_sync(async_view)(async_request, **kwargs))
+        self.assertEqual(actual, expected)
+        return actual
+
+    def test_tags(self):
+        status, data = self.compare(
+            TagsViewSet, {'get': 'list'}, '/api/tags/'
+        )
+        self.assertEqual(len(data), Tag.objects.count())
+        tag = Tag.objects.first()
+        self.compare(
+            TagsViewSet, {'get': 'retrieve'}, f'/api/tags/{tag.pk}/',
+            pk=str(tag.pk)
+        )
+
+    def test_ingredients(self):
+        for params in ({}, {'name': 'мол'}, {'name': 'МОЛ'}):
+            with self.subTest(params=params):
+                self.compare(
+                    IngredientsViewSet, {'get': 'list'},
+                    '/api/ingredients/', params
+                )
+
+    def test_recipe_list(self):
+        for user in (None, self.user):
+            for params in (
+                {},
+                {'page': 2, 'limit': 2},
+                {'page': 3, 'limit': 2},
+                {'page': 9},
+                {'page': 'last', 'limit': 2},
+                {'count': 'false', 'limit': 2},
+                {'cursor': '', 'limit': 2},
+                {'ordering': 'quickest', 'limit': 3},
+                {'is_favorited': 1},
+            ):
+                with self.subTest(user=user, params=params):
+                    self.compare(
+                        RecipesViewSet, {'get': 'list', 'post': 'create'},
+                        '/api/recipes/', params, user=user
+                    )
+
+    def test_recipe_list_queries_page_concurrently(self):
+        # Аутентифицированный запрос мимо кэша ответов: COUNT(*) и
+        # страница идут в apaginate_queryset отдельными вызовами.
+        with mock.patch.object(
+            pagination, 'run_in_thread', wraps=pagination.run_in_thread
+        ) as run_in_thread:
+            status, data = self.compare(
+                RecipesViewSet, {'get': 'list'}, '/api/recipes/',
+                {'page': 2, 'limit': 2}, user=self.user
+            )
+        self.assertEqual(status, 200)
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(run_in_thread.call_count, 2)
+        count_call, page_call = run_in_thread.call_args_list
+        self.assertEqual(count_call.args[0].__name__, 'count')
+        self.assertIs(page_call.args[0], list)
+
+    def test_recipe_detail(self):
+        actions = {'get': 'retrieve', 'patch': 'partial_update'}
+        recipe = self.recipes[0]
+        for user in (None, self.user):
+            for pk in (str(recipe.pk), '999999'):
+                with self.subTest(user=user, pk=pk):
+                    self.compare(
+                        RecipesViewSet, actions, f'/api/recipes/{pk}/',
+                        user=user, pk=pk
+                    )
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.urls import reverse
+
+from api import bulk
+from api.constants import BULK_MAX_IDS
+from api.models import Favorite, FeedEntry, Recipe
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_recipe, create_user
+from users.models import Subscribe, User
+
+MISSING_ID = 10 ** 6
+
+
+class BulkRelationTest(FoodgramTestCase):
+
+    authenticate_as = 'user'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        cls.authors = [create_user(f'author{index}') for index in range(3)]
+        cls.recipes = [create_recipe(author) for author in cls.authors]
+
+    def batch(self, url_name, method, ids):
+        response = getattr(self.client, method)(
+            reverse(url_name), {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            (result['id'], result['status'])
+            for result in response.json()['results']
+        ]
+
+    def favorites_counts(self):
+        return list(
+            Recipe.objects.filter(pk__in=[r.id for r in self.recipes])
+            .order_by('pk').values_list('favorites_count', flat=True)
+        )
+
+    def followers_counts(self):
+        return list(
+            User.objects.filter(pk__in=[a.id for a in self.authors])
+            .order_by('pk').values_list('followers_count', flat=True)
+        )
+
+    def test_favorite_batch(self):
+        first, second, third = [recipe.id for recipe in self.recipes]
+        Favorite.objects.create(user=self.user, recipe_id=first)
+        self.assertEqual(
+            self.batch(
+                'recipes-favorite-batch', 'post',
+                [second, first, MISSING_ID, second]
+            ),
+            [(second, 'created'), (first, 'exists'), (MISSING_ID, 'not_found')]
+        )
+        self.assertEqual(self.favorites_counts(), [1, 1, 0])
+        self.assertEqual(
+            self.batch(
+                'recipes-favorite-batch', 'delete',
+                [first, third, MISSING_ID]
+            ),
+            [(first, 'deleted'), (third, 'missing'), (MISSING_ID, 'not_found')]
+        )
+        self.assertEqual(self.favorites_counts(), [0, 1, 0])
+        self.assertEqual(
+            list(self.user.favorite_user.values_list('recipe', flat=True)),
+            [second]
+        )
+
+    def test_concurrent_add_is_not_counted(self):
+        # Связь появилась между проверкой и INSERT: ее создал и уже
+        # посчитал одновременный запрос.
+        recipe = self.recipes[0]
+        resolve = bulk.favorites.resolve
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        with mock.patch.object(
+            bulk.favorites, 'resolve',
+            lambda user, ids: dict.fromkeys(resolve(user, ids), False)
+        ):
+            self.assertEqual(
+                self.batch('recipes-favorite-batch', 'post', [recipe.id]),
+                [(recipe.id, 'exists')]
+            )
+        self.assertEqual(self.favorites_counts(), [1, 0, 0])
+
+    def test_subscribe_batch(self):
+        first, second, third = [author.id for author in self.authors]
+        Subscribe.objects.create(user=self.user, author_id=first)
+        self.assertEqual(
+            self.batch(
+                'users-subscribe-batch', 'post',
+                [first, second, self.user.id, MISSING_ID]
+            ),
+            [
+                (first, 'exists'), (second, 'created'),
+                (self.user.id, 'not_found'), (MISSING_ID, 'not_found'),
+            ]
+        )
+        self.assertEqual(self.followers_counts(), [1, 1, 0])
+        self.assertEqual(
+            set(self.user.feed_entries.values_list('recipe', flat=True)),
+            {self.recipes[0].id, self.recipes[1].id}
+        )
+        self.assertEqual(
+            self.batch('users-subscribe-batch', 'delete', [second, third]),
+            [(second, 'deleted'), (third, 'missing')]
+        )
+        self.assertEqual(self.followers_counts(), [1, 0, 0])
+        self.assertFalse(
+            FeedEntry.objects.filter(recipe=self.recipes[1]).exists()
+        )
+
+    def test_invalid_ids(self):
+        for ids in ([], ['id'], [0], list(range(1, BULK_MAX_IDS + 2))):
+            with self.subTest(ids=ids):
+                response = self.client.post(
+                    reverse('recipes-favorite-batch'), {'ids': ids},
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 400)
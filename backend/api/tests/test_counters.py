@@ -0,0 +1,69 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.models import Favorite, Recipe, ShoppingCart
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_recipe, create_user
+from users.models import Subscribe, User
+
+
+class CounterFieldsTest(FoodgramTestCase):
+    """Полный save() не затирает счетчики, измененные через F()."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.recipe = create_recipe(cls.author)
+
+    def test_recipe_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        recipe.name = 'Новое название'
+        with CaptureQueriesContext(connection) as queries:
+            recipe.save()
+        update = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "api_recipe"')
+        )
+        self.assertNotIn('favorites_count', update)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.cart_count, 1)
+
+    def test_user_save_keeps_counters(self):
+        author = User.objects.get(pk=self.author.pk)
+        create_recipe(self.author, name='Второй')
+        Subscribe.objects.create(user=self.user, author=self.author)
+        author.set_password('new-password-123')
+        author.save()
+        author.refresh_from_db()
+        self.assertTrue(author.check_password('new-password-123'))
+        self.assertEqual(author.recipes_count, 2)
+        self.assertEqual(author.followers_count, 1)
+
+    def test_api_update_keeps_counters(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client_for(self.author).patch(
+            reverse('recipes-detail', args=[self.recipe.pk]),
+            {'name': 'Правка'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_deferred_fields_are_not_written(self):
+        recipe = Recipe.objects.defer('text').get(pk=self.recipe.pk)
+        recipe.name = 'Без текста'
+        with CaptureQueriesContext(connection) as queries:
+            recipe.save()
+        update = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "api_recipe"')
+        )
+        self.assertNotIn('"text"', update)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.text, 'Текст рецепта.')
@@ -0,0 +1,131 @@
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+
+from api.feed import deliver, run_in_background
+from api.models import FeedEntry, Recipe
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_recipe, create_user
+from users.models import Subscribe
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2)
+class FeedTest(FoodgramTestCase):
+
+    authenticate_as = 'user'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        cls.other = create_user('other')
+        cls.author = create_user('author')
+        cls.celebrity = create_user('celebrity')
+        cls.recipes = [
+            create_recipe(author, name=f'Рецепт {index}')
+            for index in range(3)
+            for author in (cls.author, cls.celebrity)
+        ]
+
+    def subscribe(self, user, author):
+        Subscribe.objects.create(user=user, author=author)
+        author.refresh_from_db()
+
+    def feed_ids(self, user):
+        return set(
+            FeedEntry.objects.filter(user=user)
+            .values_list('recipe_id', flat=True)
+        )
+
+    def recipe_ids(self, author):
+        return {
+            recipe.id for recipe in self.recipes if recipe.author == author
+        }
+
+    def read_feed(self, limit):
+        ids = []
+        url = reverse('recipes-feed') + f'?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), limit)
+            ids += [recipe['id'] for recipe in data['results']]
+            url = data['next']
+        return ids
+
+    def test_merges_entries_and_celebrities(self):
+        self.subscribe(self.user, self.author)
+        # Первый подписчик получает рецепты в ленту, на втором автор
+        # становится «знаменитостью» и подмешивается при чтении.
+        self.subscribe(self.other, self.celebrity)
+        self.subscribe(self.user, self.celebrity)
+        self.assertEqual(
+            self.feed_ids(self.user), self.recipe_ids(self.author)
+        )
+        # Запись, разложенная до того, как автор стал «знаменитостью».
+        FeedEntry.objects.create(user=self.user, recipe=self.recipes[-1])
+        expected = list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        for limit in (1, 2, 4, 10):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.read_feed(limit), expected)
+
+    def test_previous_page(self):
+        self.subscribe(self.other, self.celebrity)
+        self.subscribe(self.user, self.celebrity)
+        self.subscribe(self.user, self.author)
+        first = self.client.get(reverse('recipes-feed'), {'limit': 2})
+        second = self.client.get(first.json()['next'])
+        previous = self.client.get(second.json()['previous'])
+        self.assertEqual(
+            previous.json()['results'], first.json()['results']
+        )
+
+    def test_demoted_author_is_delivered(self):
+        self.subscribe(self.other, self.celebrity)
+        self.subscribe(self.user, self.celebrity)
+        self.assertEqual(self.feed_ids(self.user), set())
+        Subscribe.objects.get(user=self.other, author=self.celebrity).delete()
+        self.assertEqual(
+            self.feed_ids(self.user), self.recipe_ids(self.celebrity)
+        )
+        self.assertEqual(
+            set(self.read_feed(10)), self.recipe_ids(self.celebrity)
+        )
+
+    def test_bulk_unsubscribe_delivers_demoted_author(self):
+        self.subscribe(self.other, self.celebrity)
+        self.subscribe(self.user, self.celebrity)
+        self.assertEqual(self.feed_ids(self.user), set())
+        response = self.client_for(self.other).delete(
+            reverse('users-subscribe-batch'),
+            {'ids': [self.celebrity.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.feed_ids(self.user), self.recipe_ids(self.celebrity)
+        )
+
+    @override_settings(FEED_MAX_LENGTH=3)
+    def test_publish_trims_feed(self):
+        self.subscribe(self.user, self.author)
+        recipes = [
+            create_recipe(self.author, name=f'Новый {index}')
+            for index in range(3)
+        ]
+        self.assertEqual(
+            self.feed_ids(self.user), {recipe.id for recipe in recipes}
+        )
+
+    @override_settings(FEED_SYNC_FANOUT=0)
+    def test_large_audience_in_background(self):
+        self.subscribe(self.user, self.author)
+        with mock.patch('api.feed.executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = create_recipe(self.author)
+        executor.submit.assert_called_once_with(
+            run_in_background, deliver, self.author.id, [recipe.id]
+        )
@@ -0,0 +1,114 @@
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from api.images import (process_recipe_image, schedule_image_variants,
+                        variant_name)
+from api.models import Recipe
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_recipe, create_user
+
+VARIANTS = {'thumbnail': 320, 'card': 640, 'full': 1280}
+
+
+def save_image(name, size, mode='RGBA'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, 'PNG')
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+@override_settings(
+    RECIPE_IMAGE_VARIANTS=VARIANTS, RECIPE_IMAGE_FORMATS=('webp', 'jpeg')
+)
+class RecipeImageVariantsTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.recipe = create_recipe(
+            self.author, image=save_image('recipes/photo.png', (800, 400))
+        )
+
+    def process(self, recipe):
+        # connection.close() в тесте закрыл бы транзакцию TestCase.
+        with mock.patch('api.images.connection'), \
+                self.captureOnCommitCallbacks(execute=True):
+            process_recipe_image(recipe.id, recipe.image.name)
+        recipe.refresh_from_db()
+        return recipe.image_variants
+
+    def test_schedule_after_commit(self):
+        with mock.patch('api.images.executor') as executor:
+            with self.captureOnCommitCallbacks() as callbacks:
+                schedule_image_variants(self.recipe)
+            executor.submit.assert_not_called()
+            for callback in callbacks:
+                callback()
+        executor.submit.assert_called_once_with(
+            process_recipe_image, self.recipe.id, self.recipe.image.name
+        )
+
+    def test_variants_are_not_upscaled(self):
+        variants = self.process(self.recipe)
+        self.assertEqual(set(variants), set(VARIANTS))
+        for variant, width in (
+            ('thumbnail', 320), ('card', 640), ('full', 800)
+        ):
+            description = variants[variant]
+            self.assertEqual(
+                (description['width'], description['height']),
+                (width, width // 2)
+            )
+            for image_format in ('webp', 'jpeg'):
+                name = description[image_format]
+                self.assertEqual(name, variant_name(
+                    self.recipe.image.name, variant, image_format
+                ))
+                with default_storage.open(name) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.format, image_format.upper())
+                    self.assertEqual(image.width, width)
+
+    def test_replaced_image_is_ignored(self):
+        original = self.recipe.image.name
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image=save_image('recipes/other.png', (100, 100))
+        )
+        with mock.patch('api.images.connection'):
+            process_recipe_image(self.recipe.id, original)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_broken_image_is_logged(self):
+        name = default_storage.save('recipes/broken.png', ContentFile(b'x'))
+        Recipe.objects.filter(pk=self.recipe.pk).update(image=name)
+        self.recipe.refresh_from_db()
+        with self.assertLogs('api.images', 'ERROR'):
+            self.assertEqual(self.process(self.recipe), {})
+
+    def test_api_output(self):
+        url = reverse('recipes-detail', args=[self.recipe.id])
+        self.assertEqual(self.client.get(url).json()['image_variants'], {})
+        self.process(self.recipe)
+        variants = self.client.get(url).json()['image_variants']
+        self.assertEqual(variants['full']['width'], 800)
+        self.assertEqual(
+            variants['card']['webp'],
+            'http://testserver' + default_storage.url(
+                variant_name(self.recipe.image.name, 'card', 'webp')
+            )
+        )
@@ -0,0 +1,46 @@
+from django.urls import reverse
+
+from api.models import Ingredient
+from api.tests.base import FoodgramTestCase
+
+NAMES = (
+    'сгущенное молоко', 'молотый перец', 'мука', 'молоко',
+    'кокосовое молоко',
+)
+
+
+class IngredientSearchTest(FoodgramTestCase):
+    """Совпадения по началу названия идут раньше совпадений внутри."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in NAMES:
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def search(self, **params):
+        response = self.client.get(reverse('ingredients-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_then_substring(self):
+        self.assertEqual(self.search(name='мол'), [
+            'молоко', 'молотый перец', 'кокосовое молоко',
+            'сгущенное молоко',
+        ])
+
+    def test_query_is_case_insensitive(self):
+        self.assertEqual(
+            self.search(name=' МОЛОКО '),
+            ['молоко', 'кокосовое молоко', 'сгущенное молоко']
+        )
+
+    def test_limit(self):
+        self.assertEqual(
+            self.search(name='мол', limit=3),
+            ['молоко', 'молотый перец', 'кокосовое молоко']
+        )
+        self.assertEqual(len(self.search(limit=2)), 2)
+
+    def test_no_query(self):
+        self.assertEqual(sorted(self.search()), sorted(NAMES))
+        self.assertEqual(self.search(name='соль'), [])
@@ -0,0 +1,79 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.urls import reverse
+
+from api.cache import check_shared_caches
+from api.models import Ingredient, Tag
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_ingredients, create_tags
+
+
+class VersionedListCacheTest(FoodgramTestCase):
+    """ETag списков тегов и ингредиентов меняется вместе с данными."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_tags(2)
+        create_ingredients(2)
+
+    def get(self, url, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def test_not_modified(self):
+        for url in (reverse('tags-list'), reverse('ingredients-list')):
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(0):
+                    response = self.get(url, response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_etag_depends_on_query(self):
+        url = reverse('ingredients-list')
+        etag = self.get(url)['ETag']
+        response = self.get(url, etag, name='ингр')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_changed_data(self):
+        url = reverse('tags-list')
+        etag = self.get(url)['ETag']
+        Tag.objects.create(name='Новый', color='#000000', slug='new')
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        url = reverse('ingredients-list')
+        etag = self.get(url)['ETag']
+        Ingredient.objects.filter(pk=Ingredient.objects.first().pk).delete()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_version_bumped_by_another_process(self):
+        # Так версию меняют load_data и recount.
+        url = reverse('tags-list')
+        etag = self.get(url)['ETag']
+        subprocess.run(
+            [
+                sys.executable, 'manage.py', 'shell', '-c',
+                "from api.cache import bump_version; bump_version('tags')",
+            ],
+            cwd=settings.BASE_DIR, check=True, capture_output=True
+        )
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+    def test_process_local_cache_is_rejected(self):
+        for backend in ('locmem.LocMemCache', 'dummy.DummyCache'):
+            caches = {'default': {
+                'BACKEND': f'django.core.cache.backends.{backend}',
+            }}
+            with self.subTest(backend=backend):
+                with override_settings(CACHES=caches):
+                    with self.assertRaises(ImproperlyConfigured):
+                        check_shared_caches()
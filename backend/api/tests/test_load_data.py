@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+from api.cache import get_version
+from api.models import Ingredient, Tag
+from api.tests.base import FoodgramTestCase
+
+
+class LoadDataTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, *paths, copy=False):
+        options = () if copy else ('--no-copy',)
+        call_command('load_data', *paths, *options, stdout=StringIO())
+
+    def test_file_name_prefix(self):
+        ingredients = self.write('ingredients_extra.json', json.dumps([
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'name': 'соль', 'measurement_unit': 'г'},
+        ], ensure_ascii=False))
+        tags = self.write('tags-2023.csv', 'Завтрак,#E26C2D,breakfast\n')
+        versions = get_version('ingredients'), get_version('tags')
+        self.load(ingredients, tags)
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertEqual(Tag.objects.get().slug, 'breakfast')
+        # Сброшены версии пространств имен моделей, а не имен файлов.
+        self.assertGreater(get_version('ingredients'), versions[0])
+        self.assertGreater(get_version('tags'), versions[1])
+
+    def test_repeated_load_skips_duplicates(self):
+        path = self.write('ingredients.csv', 'мука,г\nмука,г\nсоль,г\n')
+        self.load(path)
+        self.load(path)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_csv_header_is_skipped(self):
+        path = self.write(
+            'ingredients.csv', 'name,measurement_unit\nмука,г\n'
+        )
+        self.load(path)
+        self.assertEqual(
+            list(Ingredient.objects.values_list('name', flat=True)), ['мука']
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY есть в Postgres')
+    def test_copy(self):
+        path = self.write(
+            'ingredients.csv', 'name,measurement_unit\nмука,г\nмука,г\n'
+        )
+        self.load(path, copy=True)
+        self.load(path, copy=True)
+        self.assertEqual(
+            list(Ingredient.objects.values_list('name', flat=True)), ['мука']
+        )
+
+    def test_unknown_file(self):
+        path = self.write('recipes.json', '[]')
+        with self.assertRaisesMessage(CommandError, 'Unknown data file'):
+            self.load(path)
@@ -0,0 +1,67 @@
+import re
+
+from django.test import override_settings
+
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_user
+
+from backend.metrics import slow_requests
+
+SERVER_TIMING = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", serialize;dur=([\d.]+), '
+    r'app;dur=[\d.]+, render;dur=[\d.]+, total;dur=[\d.]+$'
+)
+
+
+@override_settings(METRICS_SERVER_TIMING=True)
+class ServerTimingTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(3):
+            create_user(f'user{index}')
+
+    def queries(self, response):
+        self.assertEqual(response.status_code, 200)
+        return int(SERVER_TIMING.match(response['Server-Timing']).group(1))
+
+    def test_sync_view_under_wsgi(self):
+        # COUNT(*) и страница пользователей.
+        response = self.client.get('/api/users/')
+        self.assertEqual(self.queries(response), 2)
+
+    async def test_sync_view_under_asgi(self):
+        # Синхронный вид выполняется в потоке sync_to_async, но его
+        # запросы тоже попадают в Server-Timing.
+        response = await self.async_client.get('/api/users/')
+        self.assertEqual(self.queries(response), 2)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_serializer_time(self):
+        slow_requests.items.clear()
+        response = self.client.get('/api/users/')
+        serialize = float(
+            SERVER_TIMING.match(response['Server-Timing']).group(2)
+        )
+        self.assertGreater(serialize, 0)
+        [metrics] = slow_requests.snapshot()
+        self.assertEqual(metrics['serialize_ms'], serialize)
+
+
+@override_settings(METRICS_SERVER_TIMING=False)
+class ServerTimingVisibilityTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.admin = create_user('admin', is_staff=True)
+
+    def test_hidden_from_users(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/users/'))
+        self.assertNotIn(
+            'Server-Timing', self.client_for(self.user).get('/api/users/')
+        )
+
+    def test_shown_to_staff(self):
+        response = self.client_for(self.admin).get('/api/users/')
+        self.assertRegex(response['Server-Timing'], SERVER_TIMING)
@@ -0,0 +1,61 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+MERGE_FROM = [('api', '0002_shoppinglistitem'), ('users', '0001_initial')]
+MERGE_TO = [('api', '0003_unique_ingredient'), ('users', '0001_initial')]
+
+
+class MergeDuplicateIngredientsTest(TransactionTestCase):
+    """0003 переносит количества дублей на оставшийся ингредиент."""
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_amounts_are_merged(self):
+        apps = self.migrate(MERGE_FROM)
+        User = apps.get_model('users', 'User')
+        Ingredient = apps.get_model('api', 'Ingredient')
+        Recipe = apps.get_model('api', 'Recipe')
+        RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+        author = User.objects.create(username='author', email='a@test.local')
+        kept, *duplicates = [
+            Ingredient.objects.create(name='мука', measurement_unit='г')
+            for _ in range(3)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=1, image='recipes/test.png'
+            )
+            for index in range(3)
+        ]
+        for recipe, ingredients in zip(recipes, (
+            (kept, duplicates[0]),
+            duplicates,
+            duplicates[1:],
+        )):
+            for amount, ingredient in enumerate(ingredients, start=1):
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount * 10
+                )
+        apps = self.migrate(MERGE_TO)
+        Ingredient = apps.get_model('api', 'Ingredient')
+        RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+        self.assertEqual(
+            list(Ingredient.objects.values_list('pk', flat=True)), [kept.pk]
+        )
+        self.assertEqual(
+            dict(RecipeIngredient.objects.values_list('recipe', 'amount')),
+            {recipes[0].pk: 30, recipes[1].pk: 30, recipes[2].pk: 10}
+        )
+        self.assertEqual(
+            set(RecipeIngredient.objects.values_list('ingredient', flat=True)),
+            {kept.pk}
+        )
@@ -0,0 +1,33 @@
+import tempfile
+from io import StringIO
+
+from django.test import override_settings
+
+from api.tests.base import FoodgramTestCase
+from benchmarks.querycount import SIZES, run_query_counts
+
+
+class QueryCountsTest(FoodgramTestCase):
+    """Число SQL-запросов маршрутов api/urls.py не растет с данными.
+
+    Каждый маршрут вызывается анонимом и авторизованным пользователем
+    на страницах из SIZES объектов (см. benchmarks.querycount).
+    """
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_query_counts_do_not_grow(self):
+        output = StringIO()
+        failures = run_query_counts(sizes=SIZES, stdout=output)
+        # В сообщении — выросшие маршруты вместе с лишним SQL.
+        report = ''.join(
+            line for line in output.getvalue().splitlines(keepends=True)
+            if not line.startswith('ok')
+        )
+        self.assertEqual(failures, 0, f'\n{report}')
@@ -0,0 +1,395 @@
+import json
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from api.images import process_recipe_image
+from api.models import Favorite, Recipe, Tag
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import (create_ingredients, create_recipe,
+                                 create_tags, create_user)
+from users.models import Subscribe
+
+
+class RecipeQueriesTest(FoodgramTestCase):
+    """Число запросов ленты и карточки не зависит от числа рецептов."""
+
+    authenticate_as = 'user'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        tags = create_tags(3)
+        ingredients = create_ingredients(5)
+        cls.recipes = []
+        for index in range(5):
+            author = create_user(f'author{index}')
+            Subscribe.objects.create(user=cls.user, author=author)
+            cls.recipes.append(create_recipe(
+                author, tags, ingredients, name=f'Рецепт {index}'
+            ))
+
+    def setUp(self):
+        super().setUp()
+        self.anonymous = self.client_class()
+
+    def test_list_anonymous(self):
+        # COUNT(*), страница, теги, ингредиенты.
+        with self.assertNumQueries(4):
+            response = self.anonymous.get(reverse('recipes-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_list_authenticated(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('recipes-list'))
+        self.assertEqual(response.status_code, 200)
+        recipe = response.json()['results'][0]
+        self.assertTrue(recipe['author']['is_subscribed'])
+        self.assertEqual(len(recipe['tags']), 3)
+        self.assertEqual(len(recipe['ingredients']), 5)
+
+    def test_retrieve(self):
+        url = reverse('recipes-detail', args=[self.recipes[0].id])
+        # Рецепт с автором, теги, ингредиенты.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(3):
+            response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+
+
+class RecipeUpdateTest(FoodgramTestCase):
+
+    authenticate_as = 'author'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tags = create_tags(2)
+        cls.ingredients = create_ingredients(3)
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(
+            self.author, self.tags[:1], self.ingredients[:2]
+        )
+        self.url = reverse('recipes-detail', args=[self.recipe.id])
+
+    def get_rows(self):
+        return dict(
+            self.recipe.recipes.values_list('ingredient_id', 'id')
+        )
+
+    def test_patch_without_tags_and_ingredients(self):
+        rows = self.get_rows()
+        response = self.client.patch(self.url, {'name': 'Y'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Y')
+        self.assertEqual(self.get_rows(), rows)
+        self.assertEqual(list(self.recipe.tags.all()), self.tags[:1])
+
+    def test_patch_ingredients_diff(self):
+        kept, removed = self.ingredients[:2]
+        added = self.ingredients[2]
+        rows = self.get_rows()
+        response = self.client.patch(self.url, {'ingredients': [
+            {'id': kept.id, 'amount': 10},
+            {'id': added.id, 'amount': 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        updated = self.get_rows()
+        self.assertEqual(set(updated), {kept.id, added.id})
+        # Неизменившаяся строка не пересоздается.
+        self.assertEqual(updated[kept.id], rows[kept.id])
+        self.assertNotIn(removed.id, updated)
+
+    def test_patch_rejects_empty_values(self):
+        for data in ({'ingredients': []}, {'tags': []}, {'name': ''}):
+            with self.subTest(data=data):
+                response = self.client.patch(self.url, data, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_put_requires_all_fields(self):
+        response = self.client.put(self.url, {'name': 'Y'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(RECIPE_IMAGE_VARIANTS={'card': 64})
+class RecipeMultipartTest(FoodgramTestCase):
+    """Картинка рецепта файлом в multipart/form-data."""
+
+    authenticate_as = 'author'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tags = create_tags(2)
+        cls.ingredients = create_ingredients(2)
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        executor = mock.patch('api.images.executor')
+        self.executor = executor.start()
+        self.addCleanup(executor.stop)
+
+    def image(self, name='photo.png', size=(80, 40)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'green').save(buffer, 'PNG')
+        return SimpleUploadedFile(
+            name, buffer.getvalue(), content_type='image/png'
+        )
+
+    def post(self, url, data, method='post'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, data, format='multipart')
+
+    def create(self):
+        response = self.post(reverse('recipes-list'), {
+            'name': 'Из формы', 'text': 'Текст', 'cooking_time': 15,
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': json.dumps([
+                {'id': ingredient.id, 'amount': 5}
+                for ingredient in self.ingredients
+            ]),
+            'image': self.image(),
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        return Recipe.objects.get(pk=response.json()['id'])
+
+    def test_create(self):
+        recipe = self.create()
+        self.assertEqual(recipe.name, 'Из формы')
+        self.assertEqual(set(recipe.tags.all()), set(self.tags))
+        self.assertEqual(recipe.recipes.count(), 2)
+        with recipe.image.open() as file:
+            self.assertEqual(Image.open(file).size, (80, 40))
+        self.executor.submit.assert_called_once_with(
+            process_recipe_image, recipe.id, recipe.image.name
+        )
+
+    def test_patch_image(self):
+        recipe = self.create()
+        original = recipe.image.name
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_variants={'card': {'width': 64}}
+        )
+        url = reverse('recipes-detail', args=[recipe.id])
+        response = self.post(
+            url, {'image': self.image('new.png', (30, 30))}, 'patch'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.image.name, original)
+        # Старые варианты не отдаются, пока не построены новые.
+        self.assertEqual(recipe.image_variants, {})
+        self.assertEqual(recipe.name, 'Из формы')
+        self.assertEqual(self.executor.submit.call_count, 2)
+
+    def test_patch_without_image(self):
+        recipe = self.create()
+        response = self.post(
+            reverse('recipes-detail', args=[recipe.id]),
+            {'name': 'Новое', 'tags': [self.tags[0].id]}, 'patch'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое')
+        self.assertEqual(list(recipe.tags.all()), self.tags[:1])
+        self.assertEqual(recipe.recipes.count(), 2)
+        self.assertEqual(self.executor.submit.call_count, 1)
+
+    def test_invalid_ingredients(self):
+        response = self.post(reverse('recipes-list'), {
+            'name': 'Из формы', 'text': 'Текст', 'cooking_time': 15,
+            'tags': [self.tags[0].id], 'ingredients': 'не JSON',
+            'image': self.image(),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+
+
+class RecipeTagFilterTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tags = create_tags(3)
+        cls.recipe = create_recipe(cls.author, cls.tags[:2])
+        create_recipe(cls.author, cls.tags[2:], name='Без общих тегов')
+
+    def get(self, *slugs):
+        response = self.client.get(
+            reverse('recipes-list'), {'tags': list(slugs)}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_no_duplicates_for_several_tags(self):
+        data = self.get(self.tags[0].slug, self.tags[1].slug)
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(len(data['results']), 1)
+        self.assertEqual(data['results'][0]['id'], self.recipe.id)
+
+    def test_any_of_tags(self):
+        data = self.get(self.tags[0].slug, self.tags[2].slug)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(len(data['results']), 2)
+
+    def test_new_tag_is_known(self):
+        self.get(self.tags[0].slug)
+        tag = Tag.objects.create(name='Новый', color='#000000', slug='new')
+        self.recipe.tags.add(tag)
+        self.assertEqual(self.get(tag.slug)['count'], 1)
+
+
+class RecipeCursorPaginationTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        # Новые рецепты идут первыми: порядок ('-pub_date', '-id').
+        cls.ids = [
+            create_recipe(author, name=f'Рецепт {index}').id
+            for index in range(5)
+        ][::-1]
+
+    def get(self, url=None, **params):
+        response = self.client.get(url or reverse('recipes-list'), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data, [recipe['id'] for recipe in data['results']]
+
+    def test_next_and_previous_links(self):
+        data, ids = self.get(cursor='', limit=2)
+        self.assertEqual(ids, self.ids[:2])
+        self.assertEqual(data['count'], 5)
+        self.assertIsNone(data['previous'])
+        data, ids = self.get(data['next'])
+        self.assertEqual(ids, self.ids[2:4])
+        data, ids = self.get(data['next'])
+        self.assertEqual(ids, self.ids[4:])
+        self.assertIsNone(data['next'])
+        data, ids = self.get(data['previous'])
+        self.assertEqual(ids, self.ids[2:4])
+        data, ids = self.get(data['previous'])
+        self.assertEqual(ids, self.ids[:2])
+        self.assertIsNone(data['previous'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', 'WyJuIl0=', 'WyJ4IiwgMSwgMl0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    reverse('recipes-list'), {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_without_count(self):
+        data, ids = self.get(cursor='', limit=2, count='false')
+        self.assertNotIn('count', data)
+        self.assertEqual(ids, self.ids[:2])
+        data, ids = self.get(limit=2, count='false')
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['previous'])
+        data, ids = self.get(data['next'])
+        data, ids = self.get(data['next'])
+        self.assertEqual(ids, self.ids[4:])
+        self.assertIsNone(data['next'])
+        self.assertIn('page=2', data['previous'])
+        response = self.client.get(
+            reverse('recipes-list'), {'limit': 2, 'count': 'false', 'page': 4}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeOrderingTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        fans = [create_user(f'fan{index}') for index in range(2)]
+        cls.recipes = [
+            create_recipe(author, name=f'Рецепт {index}', cooking_time=time)
+            for index, time in enumerate((30, 5, 60, 5))
+        ]
+        for fan in fans:
+            Favorite.objects.create(user=fan, recipe=cls.recipes[2])
+        Favorite.objects.create(user=fans[0], recipe=cls.recipes[0])
+
+    def get(self, url=None, **params):
+        response = self.client.get(url or reverse('recipes-list'), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data, [recipe['id'] for recipe in data['results']]
+
+    def assertOrder(self, ids, indexes):
+        self.assertEqual(ids, [self.recipes[index].id for index in indexes])
+
+    def test_orderings(self):
+        for ordering, indexes in (
+            (None, (3, 2, 1, 0)),
+            ('recent', (3, 2, 1, 0)),
+            ('popular', (2, 0, 3, 1)),
+            ('quickest', (3, 1, 0, 2)),
+        ):
+            params = {'ordering': ordering} if ordering else {}
+            with self.subTest(ordering=ordering):
+                self.assertOrder(self.get(**params)[1], indexes)
+
+    def test_cursor_follows_ordering(self):
+        for ordering, indexes in (
+            ('popular', (2, 0, 3, 1)),
+            ('quickest', (3, 1, 0, 2)),
+        ):
+            with self.subTest(ordering=ordering):
+                data, first = self.get(ordering=ordering, cursor='', limit=3)
+                self.assertIn(f'ordering={ordering}', data['next'])
+                _, second = self.get(data['next'])
+                self.assertOrder(first + second, indexes)
+
+    def test_unknown_ordering(self):
+        response = self.client.get(
+            reverse('recipes-list'), {'ordering': 'name'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchVectorColumnTest(FoodgramTestCase):
+    """tsvector рецепта не читается там, где его нет в ответе."""
+
+    authenticate_as = 'user'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        author = create_user('author')
+        cls.recipe = create_recipe(author, create_tags(1))
+        Subscribe.objects.create(user=cls.user, author=author)
+
+    def test_read_endpoints(self):
+        for url in (
+            reverse('recipes-list'),
+            reverse('recipes-detail', args=[self.recipe.id]),
+            reverse('recipes-feed'),
+            reverse('users-subscriptions'),
+        ):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                for query in queries:
+                    self.assertNotIn('search_vector', query['sql'])
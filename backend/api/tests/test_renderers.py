@@ -0,0 +1,145 @@
+import datetime
+import re
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import (PDF_ENCODING, FastJSONRenderer,
+                           ShoppingListPDFRenderer)
+from api.serializers import ValuesListSerializer
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import (clear_caches, create_ingredients,
+                                 create_recipe, create_tags, create_user)
+from users.models import Subscribe
+
+
+class ShoppingListPDFRendererTest(SimpleTestCase):
+
+    def render(self, rows):
+        return b''.join(ShoppingListPDFRenderer().stream(rows))
+
+    def test_xref_points_to_objects(self):
+        pdf = self.render([('Мука', index, 'г') for index in range(100)])
+        start = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+        self.assertTrue(pdf[start:].startswith(b'xref\n'))
+        offsets = re.findall(rb'(\d{10}) 00000 n ', pdf[start:])
+        for number, offset in enumerate(offsets, start=1):
+            self.assertTrue(
+                pdf[int(offset):].startswith(b'%d 0 obj' % number)
+            )
+
+    def test_cyrillic_font_is_embedded(self):
+        pdf = self.render([('Ёж', 1, 'шт')])
+        self.assertIn(b'/Subtype /TrueType', pdf)
+        self.assertIn(b'/FontFile2 7 0 R', pdf)
+        # Строки страницы закодированы кодами 128+ встроенного шрифта.
+        content = pdf.split(b'8 0 obj', 1)[1]
+        self.assertIn(bytes([PDF_ENCODING['Ё'], PDF_ENCODING['ж']]), content)
+
+
+class FastJSONRendererTest(SimpleTestCase):
+    """FastJSONRenderer дает те же байты, что JSONRenderer."""
+
+    def assertSameBytes(self, data, media_type='application/json'):
+        self.assertEqual(
+            FastJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type)
+        )
+
+    def test_payloads(self):
+        for data in (
+            None,
+            [],
+            {'name': 'Ёжик «в тумане»', 'text': 'a\u2028b\u2029c\n"\\'},
+            {'created': datetime.datetime(
+                2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc
+            )},
+            {'day': datetime.date(2024, 1, 2), 'id': uuid.UUID(int=1)},
+            {1: ['Ошибка.'], 'ids': [1, -2, 2 ** 63 - 1]},
+            {'big': 2 ** 70},
+            {'amount': Decimal('1.50')},
+        ):
+            with self.subTest(data=data):
+                self.assertSameBytes(data)
+
+    def test_floats(self):
+        # orjson пишет 1e20, 1e-7 и 0.00001, json — 1e+20, 1e-07 и 1e-05.
+        for data in (
+            1e20,
+            [1e-7],
+            {'value': 1e-5, 'other': [0.1, 100.0, -2.5e-300]},
+            [{'amount': 1.5}, {'amount': 1e16}],
+            {'name': 'не число: ,1.5]', 'id': 1},
+        ):
+            with self.subTest(data=data):
+                self.assertSameBytes(data)
+
+    def test_indent(self):
+        self.assertSameBytes(
+            {'name': 'Тег', 'ids': [1, 2]}, 'application/json; indent=4'
+        )
+
+
+class FastPathEndpointsTest(FoodgramTestCase):
+    """Ответы чтения те же, что у JSONRenderer и ListSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        author = create_user('author')
+        tags = create_tags(3)
+        ingredients = create_ingredients(5)
+        cls.recipes = [
+            create_recipe(
+                author, tags[:index + 1], ingredients[:index + 2],
+                amount=index + 1, name=f'Рецепт «{index}»',
+                image_variants={'card': {'webp': f'recipes/{index}.webp'}}
+            )
+            for index in range(4)
+        ]
+        Subscribe.objects.create(user=cls.user, author=author)
+
+    def get(self, client, url, params):
+        # Кэши хранят отрендеренные байты: каждый ответ считается заново.
+        clear_caches()
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assertSameResponses(self, client, url, params=None):
+        with self.subTest(url=url, params=params):
+            fast = self.get(client, url, params)
+            with mock.patch.object(
+                FastJSONRenderer, 'render', JSONRenderer.render
+            ), mock.patch.object(ValuesListSerializer, 'plain_fields', None):
+                self.assertEqual(self.get(client, url, params), fast)
+
+    def test_anonymous(self):
+        self.assertSameResponses(self.client, reverse('ingredients-list'))
+        self.assertSameResponses(
+            self.client, reverse('ingredients-list'), {'name': 'ингр'}
+        )
+        self.assertSameResponses(self.client, reverse('tags-list'))
+        self.assertSameResponses(
+            self.client, reverse('recipes-list'), {'limit': 2}
+        )
+        self.assertSameResponses(
+            self.client, reverse('recipes-detail', args=[self.recipes[0].id])
+        )
+
+    def test_authenticated(self):
+        client = self.client_for(self.user)
+        self.assertSameResponses(
+            client, reverse('recipes-list'), {'cursor': '', 'limit': 3}
+        )
+        self.assertSameResponses(
+            client, reverse('recipes-detail', args=[self.recipes[-1].id])
+        )
+        self.assertSameResponses(
+            client, reverse('users-subscriptions'), {'recipes_limit': 2}
+        )
+        self.assertSameResponses(client, reverse('recipes-feed'))
@@ -0,0 +1,360 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.mixins import ListModelMixin
+from rest_framework.response import Response
+
+from api.cache import AnonymousResponseCacheMixin, bump_version
+from api.images import process_recipe_image
+from api.models import RecipeIngredient, Tag
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import (create_ingredients, create_recipe,
+                                 create_tags, create_user)
+from core.cache import AtomicFileBasedCache
+
+
+class ResponseCacheTest(FoodgramTestCase):
+    """Кэш ответов анонимам и все пути его инвалидации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tags = create_tags(2)
+        cls.ingredients = create_ingredients(2)
+        cls.recipes = [
+            create_recipe(
+                cls.author, cls.tags, cls.ingredients, name=f'Рецепт {index}'
+            )
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.list_url = reverse('recipes-list')
+        self.detail_urls = [
+            reverse('recipes-detail', args=[recipe.id])
+            for recipe in self.recipes
+        ]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def warm(self):
+        for url in (self.list_url, *self.detail_urls):
+            self.get(url)
+
+    def assertCached(self, url, **params):
+        with self.assertNumQueries(0):
+            return self.get(url, **params)
+
+    def assertRebuilt(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(url, **params)
+        self.assertTrue(queries, f'{url} отдан из кэша')
+        return data
+
+    def change(self):
+        # Версии меняются в transaction.on_commit.
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def test_hit_without_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(self.list_url).content
+        self.assertTrue(queries)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.list_url).content
+        self.assertEqual(first, second)
+        self.get(self.detail_urls[0])
+        self.assertCached(self.detail_urls[0])
+
+    def test_query_string_is_part_of_key(self):
+        self.get(self.list_url)
+        data = self.assertRebuilt(self.list_url, limit=1)
+        self.assertEqual(len(data['results']), 1)
+        self.assertCached(self.list_url, limit=1)
+
+    def test_recipe_saved(self):
+        self.warm()
+        recipe = self.recipes[0]
+        recipe.name = 'Новое имя'
+        with self.change():
+            recipe.save()
+        names = [item['name'] for item in self.assertRebuilt(
+            self.list_url
+        )['results']]
+        self.assertIn('Новое имя', names)
+        self.assertEqual(
+            self.assertRebuilt(self.detail_urls[0])['name'], 'Новое имя'
+        )
+        self.assertCached(self.detail_urls[1])
+
+    def test_recipe_deleted(self):
+        self.warm()
+        with self.change():
+            self.recipes[1].delete()
+        self.assertEqual(self.assertRebuilt(self.list_url)['count'], 1)
+        self.assertCached(self.detail_urls[0])
+
+    def test_recipe_updated_through_api(self):
+        self.warm()
+        client = self.client_for(self.author)
+        with self.change():
+            response = client.patch(
+                self.detail_urls[0],
+                {'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 25}
+                ]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        ingredients = self.assertRebuilt(self.detail_urls[0])['ingredients']
+        self.assertEqual(
+            [item['amount'] for item in ingredients], [25]
+        )
+
+    def test_recipe_tags_changed(self):
+        self.warm()
+        with self.change():
+            self.recipes[0].tags.remove(self.tags[0])
+        self.assertEqual(
+            len(self.assertRebuilt(self.detail_urls[0])['tags']), 1
+        )
+        self.assertCached(self.detail_urls[1])
+        self.assertRebuilt(self.list_url)
+
+    def test_tag_recipes_cleared(self):
+        self.warm()
+        with self.change():
+            self.tags[1].recipe_set.clear()
+        for url in self.detail_urls:
+            self.assertEqual(len(self.assertRebuilt(url)['tags']), 1)
+
+    def test_tag_recipes_added(self):
+        tag = Tag.objects.create(name='Новый', color='#123456', slug='new')
+        self.warm()
+        with self.change():
+            tag.recipe_set.add(self.recipes[1])
+        self.assertCached(self.detail_urls[0])
+        self.assertEqual(
+            len(self.assertRebuilt(self.detail_urls[1])['tags']), 3
+        )
+
+    def test_tag_renamed(self):
+        self.warm()
+        tag = self.tags[0]
+        tag.name = 'Завтрак'
+        tag.save()
+        self.assertRebuilt(self.list_url)
+        for url in self.detail_urls:
+            tags = [item['name'] for item in self.assertRebuilt(url)['tags']]
+            self.assertIn('Завтрак', tags)
+
+    def test_ingredient_renamed(self):
+        self.warm()
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Соль'
+        ingredient.save()
+        self.assertRebuilt(self.list_url)
+        names = [
+            item['name']
+            for item in self.assertRebuilt(self.detail_urls[0])['ingredients']
+        ]
+        self.assertIn('Соль', names)
+
+    def test_author_renamed(self):
+        self.warm()
+        self.author.first_name = 'Другое'
+        with self.change():
+            self.author.save()
+        self.assertRebuilt(self.list_url)
+        for url in self.detail_urls:
+            self.assertEqual(
+                self.assertRebuilt(url)['author']['first_name'], 'Другое'
+            )
+
+    def test_author_login_keeps_cache(self):
+        self.warm()
+        with self.change():
+            self.author.save(update_fields=['last_login'])
+        self.assertCached(self.list_url)
+        for url in self.detail_urls:
+            self.assertCached(url)
+
+    def test_image_variants_updated(self):
+        recipe = self.recipes[0]
+        self.warm()
+        variants = {'thumbnail': {'width': 1, 'height': 1}}
+        with self.change(), \
+                mock.patch('api.images.build_variants',
+                           return_value=variants), \
+                mock.patch('api.images.connection'):
+            process_recipe_image(recipe.id, recipe.image.name)
+        self.assertEqual(
+            self.assertRebuilt(self.detail_urls[0])['image_variants'],
+            variants
+        )
+        self.assertRebuilt(self.list_url)
+        self.assertCached(self.detail_urls[1])
+
+    def test_admin_recipe_ingredient_changed(self):
+        admin = create_user('admin', is_staff=True, is_superuser=True)
+        self.warm()
+        row = RecipeIngredient.objects.filter(recipe=self.recipes[0]).first()
+        client = self.client_class()
+        client.force_login(admin)
+        with self.change():
+            response = client.post(
+                reverse('admin:api_recipeingredient_change', args=[row.id]),
+                {'recipe': row.recipe_id, 'ingredient': row.ingredient_id,
+                 'amount': 99}
+            )
+        self.assertEqual(response.status_code, 302)
+        amounts = [
+            item['amount']
+            for item in self.assertRebuilt(self.detail_urls[0])['ingredients']
+        ]
+        self.assertIn(99, amounts)
+        self.assertCached(self.detail_urls[1])
+
+    def test_not_cached(self):
+        self.get(self.list_url, ordering='popular')
+        self.assertRebuilt(self.list_url, ordering='popular')
+        client = self.client_for(self.author)
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(self.list_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(queries)
+        missing = reverse('recipes-detail', args=[self.recipes[1].id + 100])
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(missing)
+            self.assertEqual(response.status_code, 404)
+            self.assertTrue(queries)
+
+    def test_change_during_compute(self):
+        # Версии читаются до расчета: ответ, посчитанный во время
+        # изменения, сохраняется под старыми версиями и не отдается.
+        original = ListModelMixin.list
+
+        def list_and_change(view, request, *args, **kwargs):
+            response = original(view, request, *args, **kwargs)
+            bump_version('recipes')
+            return response
+
+        with mock.patch.object(ListModelMixin, 'list', list_and_change):
+            self.get(self.list_url)
+        self.assertRebuilt(self.list_url)
+        self.assertCached(self.list_url)
+
+    def test_stampede(self):
+        # Одновременные промахи ждут один расчет ответа.
+        clients = 8
+        calls = []
+        waiting = threading.Semaphore(0)
+        release = threading.Event()
+        wait_for_response = AnonymousResponseCacheMixin.wait_for_response
+
+        def slow_list(view, request, *args, **kwargs):
+            calls.append(threading.get_ident())
+            release.wait(5)
+            return Response({'count': 0, 'results': []})
+
+        def wait(view, *args, **kwargs):
+            waiting.release()
+            return wait_for_response(view, *args, **kwargs)
+
+        bodies = []
+
+        def request():
+            bodies.append(self.client_class().get(self.list_url).content)
+
+        waiter = mock.patch.object(
+            AnonymousResponseCacheMixin, 'wait_for_response', wait
+        )
+        with mock.patch.object(ListModelMixin, 'list', slow_list), waiter:
+            threads = [
+                threading.Thread(target=request) for _ in range(clients)
+            ]
+            for thread in threads:
+                thread.start()
+            for _ in range(clients - 1):
+                self.assertTrue(waiting.acquire(timeout=5))
+            release.set()
+            for thread in threads:
+                thread.join(10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(bodies), clients)
+        self.assertEqual(set(bodies), {b'{"count":0,"results":[]}'})
+
+
+class CacheNamespacesTest(SimpleTestCase):
+
+    def test_required(self):
+        view = AnonymousResponseCacheMixin()
+        view.action, view.kwargs = 'list', {}
+        with self.assertRaisesMessage(AssertionError, 'cache_namespaces'):
+            view.get_cache_namespaces()
+
+    def test_filled_from_kwargs(self):
+        view = AnonymousResponseCacheMixin()
+        view.cache_namespaces = {'retrieve': ('recipe:{pk}', 'tags')}
+        view.action, view.kwargs = 'retrieve', {'pk': '7'}
+        self.assertEqual(view.get_cache_namespaces(), ('recipe:7', 'tags'))
+
+
+class AtomicFileBasedCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = AtomicFileBasedCache(self.directory, {})
+
+    def test_add(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+        self.cache.set('expired', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertTrue(self.cache.add('expired', 2))
+        self.assertEqual(self.cache.get('expired'), 2)
+        # Временные файлы не остаются в каталоге кэша.
+        self.assertTrue(all(
+            name.endswith(AtomicFileBasedCache.cache_suffix)
+            for name in os.listdir(self.directory)
+        ))
+
+    def test_concurrent_add(self):
+        # Как блокировка кэша ответов: True получает ровно один.
+        # Отдельный объект кэша на поток, как у разных процессов.
+        clients = 16
+        start = threading.Barrier(clients)
+        results = []
+
+        def add(value):
+            cache = AtomicFileBasedCache(self.directory, {})
+            start.wait(5)
+            results.append((cache.add('lock', value), value))
+
+        threads = [
+            threading.Thread(target=add, args=(value,))
+            for value in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        winners = [value for added, value in results if added]
+        self.assertEqual(len(results), clients)
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(self.cache.get('lock'), winners[0])
@@ -0,0 +1,91 @@
+from django.urls import reverse
+
+from api.models import Ingredient, RecipeIngredient
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_recipe, create_user
+
+
+class RecipeSearchTest(FoodgramTestCase):
+    """Поиск рецептов: websearch на Postgres, match_in_process на SQLite."""
+
+    authenticate_as = 'user'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        cls.cabbage = Ingredient.objects.create(
+            name='Капуста', measurement_unit='г'
+        )
+        cls.beet = Ingredient.objects.create(
+            name='Свекла', measurement_unit='г'
+        )
+        cls.in_name = create_recipe(
+            cls.user, name='Капуста тушеная', text='Просто.'
+        )
+        cls.in_ingredients = create_recipe(
+            cls.user, ingredients=[cls.cabbage], name='Щи', text='Суп.'
+        )
+        cls.in_text = create_recipe(
+            cls.user, name='Рагу', text='Капуста по вкусу.'
+        )
+        cls.other = create_recipe(
+            cls.user, ingredients=[cls.beet], name='Борщ', text='Суп.'
+        )
+
+    def search(self, text, **params):
+        response = self.client.get(
+            reverse('recipes-list'), {'search': text, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_rank(self):
+        # Название важнее ингредиентов, ингредиенты важнее описания.
+        self.assertEqual(self.search('капуста'), [
+            self.in_name.id, self.in_ingredients.id, self.in_text.id
+        ])
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.search('КАПУСТА'), self.search('капуста'))
+
+    def test_all_words(self):
+        self.assertEqual(self.search('капуста щи'), [self.in_ingredients.id])
+        self.assertEqual(self.search('капуста лук'), [])
+
+    def test_explicit_ordering(self):
+        self.assertEqual(self.search('капуста', ordering='recent'), [
+            self.in_text.id, self.in_ingredients.id, self.in_name.id
+        ])
+
+    def test_recipe_ingredient_changes(self):
+        # Строки ингредиентов меняются и в обход сериализатора: вектор
+        # обновляют сигналы.
+        RecipeIngredient.objects.create(
+            recipe=self.other, ingredient=self.cabbage, amount=1
+        )
+        self.assertIn(self.other.id, self.search('капуста'))
+        RecipeIngredient.objects.filter(
+            recipe=self.other, ingredient=self.cabbage
+        ).delete()
+        self.assertNotIn(self.other.id, self.search('капуста'))
+        row = RecipeIngredient.objects.get(recipe=self.other)
+        row.ingredient = self.cabbage
+        row.save()
+        self.assertIn(self.other.id, self.search('капуста'))
+        self.assertEqual(self.search('свекла'), [])
+
+    def test_ingredient_renamed(self):
+        self.beet.name = 'Буряк'
+        self.beet.save()
+        self.assertEqual(self.search('буряк'), [self.other.id])
+
+    def test_cursor(self):
+        response = self.client.get(
+            reverse('recipes-list'), {'search': 'капуста', 'cursor': ''}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.json())
+        self.assertEqual(
+            self.search('капуста', cursor='', ordering='recent'),
+            [self.in_text.id, self.in_ingredients.id, self.in_name.id]
+        )
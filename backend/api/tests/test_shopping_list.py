@@ -0,0 +1,131 @@
+from django.urls import reverse
+
+from api.management.commands.rebuild_shopping_lists import (live_totals,
+                                                            stored_totals)
+from api.models import Ingredient, Recipe, RecipeIngredient, ShoppingCart
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import (create_ingredients, create_recipe,
+                                 create_tags, create_user)
+
+
+class ShoppingListTest(FoodgramTestCase):
+    """Инкрементальный список покупок совпадает с живым GROUP BY."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(f'user{index}') for index in range(3)]
+        cls.author = create_user('author')
+        cls.tags = create_tags(1)
+        cls.ingredients = create_ingredients(4)
+
+    def setUp(self):
+        super().setUp()
+        # У рецептов есть общий ингредиент, суммы складываются.
+        self.recipes = [
+            create_recipe(
+                self.author, self.tags, self.ingredients[index:index + 2],
+                amount=10 * (index + 1), name=f'Рецепт {index}'
+            )
+            for index in range(3)
+        ]
+        for user in self.users:
+            for recipe in self.recipes[:2]:
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+        self.client.force_authenticate(self.users[0])
+
+    def assertMatchesCarts(self):
+        self.assertEqual(list(stored_totals()), list(live_totals()))
+
+    def test_carts_created(self):
+        self.assertTrue(stored_totals().exists())
+        self.assertMatchesCarts()
+
+    def test_api_cart_add_and_remove(self):
+        url = reverse('recipes-shopping-cart', args=[self.recipes[2].id])
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertMatchesCarts()
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        url = reverse('recipes-shopping-cart', args=[self.recipes[0].id])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertMatchesCarts()
+
+    def test_api_cart_batch(self):
+        url = reverse('recipes-shopping-cart-batch')
+        ids = [recipe.id for recipe in self.recipes]
+        self.client.post(url, {'ids': ids}, format='json')
+        self.assertMatchesCarts()
+        self.client.delete(url, {'ids': ids[:2]}, format='json')
+        self.assertMatchesCarts()
+
+    def test_api_recipe_update(self):
+        response = self.client_for(self.author).patch(
+            reverse('recipes-detail', args=[self.recipes[0].id]),
+            {'ingredients': [
+                {'id': self.ingredients[1].id, 'amount': 7},
+                {'id': self.ingredients[3].id, 'amount': 3},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesCarts()
+
+    def test_api_recipe_delete(self):
+        response = self.client_for(self.author).delete(
+            reverse('recipes-detail', args=[self.recipes[0].id])
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertMatchesCarts()
+
+    def test_admin_recipe_delete(self):
+        admin = create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse('admin:api_recipe_delete', args=[self.recipes[0].id]),
+            {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Recipe.objects.filter(pk=self.recipes[0].id).exists())
+        self.assertMatchesCarts()
+
+    def test_recipe_queryset_delete(self):
+        Recipe.objects.filter(
+            pk__in=[recipe.id for recipe in self.recipes]
+        ).delete()
+        self.assertFalse(stored_totals().exists())
+
+    def test_recipe_ingredient_changes(self):
+        row = RecipeIngredient.objects.filter(recipe=self.recipes[0]).first()
+        row.amount = 99
+        row.save()
+        self.assertMatchesCarts()
+        row.ingredient = self.ingredients[3]
+        row.save()
+        self.assertMatchesCarts()
+        row.recipe = self.recipes[1]
+        row.save()
+        self.assertMatchesCarts()
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[1], ingredient=self.ingredients[0], amount=5
+        )
+        self.assertMatchesCarts()
+        RecipeIngredient.objects.filter(recipe=self.recipes[1]).delete()
+        self.assertMatchesCarts()
+
+    def test_cart_changes(self):
+        cart = ShoppingCart.objects.filter(user=self.users[0]).first()
+        cart.recipe = self.recipes[2]
+        cart.save()
+        self.assertMatchesCarts()
+        cart.user = create_user('other')
+        cart.save()
+        self.assertMatchesCarts()
+        ShoppingCart.objects.filter(user=self.users[1]).delete()
+        self.assertMatchesCarts()
+
+    def test_ingredient_delete(self):
+        Ingredient.objects.filter(pk=self.ingredients[1].pk).delete()
+        self.assertMatchesCarts()
+
+    def test_user_delete(self):
+        self.users[0].delete()
+        self.assertMatchesCarts()
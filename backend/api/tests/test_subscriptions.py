@@ -0,0 +1,42 @@
+from django.urls import reverse
+
+from api.tests.base import FoodgramTestCase
+from api.tests.factories import create_recipe, create_user
+from users.models import Subscribe
+
+
+class SubscriptionsTest(FoodgramTestCase):
+
+    authenticate_as = 'user'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        cls.authors = [create_user(f'author{index}') for index in range(3)]
+        for author in cls.authors:
+            for index in range(4):
+                create_recipe(author, name=f'Рецепт {index}')
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('users-subscriptions')
+
+    def test_no_subscriptions(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_recipes_limit(self):
+        for author in self.authors:
+            Subscribe.objects.create(user=self.user, author=author)
+        # COUNT(*), страница авторов, превью рецептов одним запросом.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'recipes_limit': 2})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 3)
+        for author in results:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], 4)
+            self.assertEqual(len(author['recipes']), 2)
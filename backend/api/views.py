@@ -1,26 +1,58 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 from users.models import Subscribe, User
-from api.filters import RecipesFilter
+from api import bulk
+from api.async_views import AsyncReadMixin
+from api.cache import (AnonymousResponseCacheMixin, VersionedListCacheMixin,
+                       recipe_namespace)
+from api.constants import (DEFAULT_RECIPE_ORDERING, RECIPE_ORDERINGS,
+                           SHOPPING_LIST_CHUNK_SIZE)
+from api.feed import feed_querysets
+from api.filters import IngredientSearchFilter, RecipesFilter
 from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                         ShoppingCart, Tag)
-from api.pagination import FoodgramPagination
+from api.pagination import FeedPagination, FoodgramPagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (CreateRecipeSerializer, IngredientSerializer,
-                             MainRecipeSerializer, RecipeSerializer,
-                             SubscribingSerializer, TagSerializer,
-                             UsersSerializer)
+from api.renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                           ShoppingListPDFRenderer, ShoppingListTextRenderer)
+from api.serializers import (BulkIdsSerializer, CreateRecipeSerializer,
+                             IngredientSerializer, MainRecipeSerializer,
+                             RecipeSerializer, SubscribingSerializer,
+                             TagSerializer, UsersSerializer)
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+def bulk_relation_response(relation, request):
+    """Пакетное действие: POST добавляет, DELETE удаляет связи.
+
+    Ответ — статус для каждого переданного id в исходном порядке.
+    """
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data['ids']
+    with transaction.atomic():
+        if request.method == 'POST':
+            results = relation.add(request.user, ids)
+        else:
+            results = relation.remove(request.user, ids)
+    return Response({'results': results})
+
+
+class TagsViewSet(
+    AsyncReadMixin,
+    VersionedListCacheMixin,
+    viewsets.ReadOnlyModelViewSet
+):
+    cache_namespace = 'tags'
     queryset = Tag.objects.all()
     permission_classes = (AllowAny, )
     serializer_class = TagSerializer
@@ -28,31 +60,105 @@ class TagsViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class IngredientsViewSet(
+    AsyncReadMixin,
+    VersionedListCacheMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
 ):
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
-    filter_backends = (filters.SearchFilter, )
+    filter_backends = (IngredientSearchFilter, )
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny, )
     pagination_class = None
-    search_fields = ('^name', )
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(
+    AnonymousResponseCacheMixin,
+    AsyncReadMixin,
+    viewsets.ModelViewSet
+):
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend, )
     pagination_class = FoodgramPagination
     permission_classes = (IsAuthorOrReadOnly, )
     filterset_class = RecipesFilter
+    # Картинку можно прислать base64 в JSON или файлом в multipart.
+    parser_classes = (JSONParser, MultiPartParser)
     http_method_names = ['get', 'post', 'patch', 'put', 'delete']
+    cache_namespaces = {
+        'list': ('recipes', 'tags', 'ingredients'),
+        'retrieve': (recipe_namespace('{pk}'), 'tags', 'ingredients'),
+    }
+
+    @property
+    def cursor_fields(self):
+        return RECIPE_ORDERINGS.get(
+            self.request.query_params.get('ordering'),
+            RECIPE_ORDERINGS[DEFAULT_RECIPE_ORDERING]
+        )
+
+    def is_response_cacheable(self, request):
+        pk = self.kwargs.get('pk')
+        return (
+            super().is_response_cacheable(request)
+            # favorites_count меняется без сигналов и смены версий.
+            and request.query_params.get('ordering') != 'popular'
+            # /recipes/007/ не должен попасть в кэш мимо версии recipe:7.
+            and (pk is None or (pk.isdigit() and str(int(pk)) == pk))
+        )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('retrieve', 'list', 'feed'):
+            return queryset
+        # tsvector нужен только фильтру поиска, в ответ он не попадает.
+        queryset = queryset.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipes',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author')
+            ))
+        )
 
     def get_serializer_class(self):
-        if self.action in ('retrieve', 'list'):
+        if self.action in ('retrieve', 'list', 'feed'):
             return MainRecipeSerializer
         return CreateRecipeSerializer
 
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        page = self.paginate_queryset(
+            feed_querysets(request.user, self.get_queryset())
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=True, methods=['post', 'delete'],
         permission_classes=(IsAuthenticated,)
@@ -60,44 +166,55 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def favorite(self, request, **kwargs):
         user = request.user
         if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=kwargs.get('pk'))
-            favorite_recipe = user.favorite_user.filter(recipe=recipe)
-            if not favorite_recipe.exists():
+            with transaction.atomic():
+                deleted, _ = user.favorite_user.filter(
+                    recipe_id=kwargs['pk']
+                ).delete()
+            if not deleted:
+                get_object_or_404(Recipe, id=kwargs['pk'])
                 return Response(
                     {'errors': 'Рецепта нет в избранном.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            favorite_recipe.delete()
             return Response(
                 {'detail': 'Рецепт успешно удален из избранного.'},
                 status=status.HTTP_204_NO_CONTENT
             )
 
-        if not Recipe.objects.filter(id=kwargs.get('pk')).exists():
+        recipe = Recipe.objects.defer('search_vector').filter(
+            id=kwargs['pk']
+        ).first()
+        if recipe is None:
             return Response(
                 {'errors': 'Рецепта не существует.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        recipe = Recipe.objects.get(id=kwargs.get('pk'))
-
-        if request.method == 'POST':
-            serializer = RecipeSerializer(
-                recipe, data=request.data,
-                context={"request": request}
-            )
-            serializer.is_valid(raise_exception=True)
-            if not user.favorite_user.filter(
-                recipe=recipe
-            ).exists():
-                Favorite.objects.create(user=request.user, recipe=recipe)
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
+        serializer = RecipeSerializer(
+            recipe, data=request.data,
+            context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        # Повтор отсекает уникальный индекс, без проверки заранее.
+        try:
+            with transaction.atomic():
+                Favorite.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
             return Response(
                 {'errors': 'Рецепт уже добавлен в избранное.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        detail=False, methods=['post', 'delete'],
+        url_path='favorite', url_name='favorite-batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_batch(self, request):
+        return bulk_relation_response(bulk.favorites, request)
 
     @action(
         detail=True, methods=['post', 'delete'],
@@ -107,69 +224,85 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, **kwargs):
         user = request.user
         if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=kwargs['pk'])
-            shopping_cart = user.cart_user.filter(recipe=recipe)
-            if not shopping_cart.exists():
+            with transaction.atomic():
+                deleted, _ = user.cart_user.filter(
+                    recipe_id=kwargs['pk']
+                ).delete()
+            if not deleted:
+                get_object_or_404(Recipe, id=kwargs['pk'])
                 return Response(
                     {'errors': 'Рецепта нет в списке.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            shopping_cart.delete()
             return Response(
                 {'detail': 'Рецепт удален из списка покупок.'},
                 status=status.HTTP_204_NO_CONTENT
             )
 
-        if not Recipe.objects.filter(id=kwargs['pk']).exists():
+        recipe = Recipe.objects.defer('search_vector').filter(
+            id=kwargs['pk']
+        ).first()
+        if recipe is None:
             return Response(
                 {'errors': 'Рецепта не существует.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        if request.method == 'POST':
-            recipe = Recipe.objects.get(id=kwargs.get('pk'))
-            serializer = RecipeSerializer(
-                recipe, data=request.data,
-                context={"request": request}
-            )
-            serializer.is_valid(raise_exception=True)
-            if not user.cart_user.filter(recipe=recipe).exists():
-                ShoppingCart.objects.create(user=request.user, recipe=recipe)
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-
+        serializer = RecipeSerializer(
+            recipe, data=request.data,
+            context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
             return Response(
                 {'errors': 'Рецепт уже находится в списке покупок.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED
+        )
 
     @action(
-        detail=False, methods=['get'],
+        detail=False, methods=['post', 'delete'],
+        url_path='shopping_cart', url_name='shopping-cart-batch',
         permission_classes=(IsAuthenticated,)
     )
+    def shopping_cart_batch(self, request):
+        return bulk_relation_response(bulk.shopping_cart, request)
+
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            ShoppingListTextRenderer, ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer, ShoppingListPDFRenderer
+        )
+    )
     def download_shopping_cart(self, request, **kwargs):
         ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__cart_recipe__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
+            request.user.shopping_list_items
+            .order_by('ingredient__name')
             .values_list(
                 'ingredient__name',
                 'total_amount',
                 'ingredient__measurement_unit'
             )
         )
-        list_for_file = []
-        [list_for_file.append(
-            '{} - {} {}.'.format(*ingredient)) for ingredient in ingredients]
-        response_file = HttpResponse(
-            'Cписок покупок:\n' + '\n'.join(list_for_file),
-            content_type='text/plain'
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response_file = StreamingHttpResponse(
+            renderer.stream(
+                ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+            ),
+            content_type=content_type
         )
         response_file['Content-Disposition'] = (
-            'attachment; filename=shopping_cart.txt'
+            f'attachment; filename=shopping_cart.{renderer.format}'
         )
         return response_file
 
@@ -181,6 +314,21 @@ class UsersViewSet(UserViewSet):
     serializer_class = UsersSerializer
     filter_backends = (DjangoFilterBackend, filters.SearchFilter,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('retrieve', 'list'):
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        )
+
     @action(
         detail=False, methods=['get'],
         pagination_class=None,
@@ -199,7 +347,11 @@ class UsersViewSet(UserViewSet):
         pagination_class=FoodgramPagination
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribing__user=request.user)
+        queryset = User.objects.filter(
+            subscribing__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
         serializer = SubscribingSerializer(
             page,
@@ -216,38 +368,42 @@ class UsersViewSet(UserViewSet):
     def subscribe(self, request, id=None):
         author = get_object_or_404(User, id=id)
         user = request.user
-        subscribtion = user.subscriber.filter(author=author)
 
         if request.method == 'POST':
-            if subscribtion.exists():
-                return Response(
-                    {'errors': 'Нельзя подписаться повторно.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
             serializer = SubscribingSerializer(
                 author, data=request.data, context={"request": request}
             )
             serializer.is_valid(raise_exception=True)
-
-            Subscribe.objects.create(
-                user=request.user, author=author
-            )
+            try:
+                with transaction.atomic():
+                    Subscribe.objects.create(user=user, author=author)
+            except IntegrityError:
+                return Response(
+                    {'errors': 'Нельзя подписаться повторно.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED
             )
 
         if request.method == 'DELETE':
-            if not subscribtion.exists():
+            with transaction.atomic():
+                deleted, _ = user.subscriber.filter(author=author).delete()
+            if not deleted:
                 return Response(
                     {'errors': 'Подписки не существует.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            get_object_or_404(
-                Subscribe, user=request.user,
-                author=author
-            ).delete()
             return Response(
                 {'detail': 'Отписка прошла успешно'},
                 status=status.HTTP_204_NO_CONTENT
             )
+
+    @action(
+        detail=False, methods=['post', 'delete'],
+        url_path='subscribe', url_name='subscribe-batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def subscribe_batch(self, request):
+        return bulk_relation_response(bulk.subscriptions, request)
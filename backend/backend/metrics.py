@@ -0,0 +1,284 @@
+import asyncio
+import functools
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+SQL_LITERALS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize_sql(sql):
+    """Убирает из SQL значения, чтобы одинаковые запросы склеивались."""
+    for pattern, replacement in SQL_LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class SlowRequestBuffer:
+    """Кольцевой буфер последних медленных запросов процесса."""
+
+    def __init__(self, size):
+        self.items = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, item):
+        with self.lock:
+            self.items.append(item)
+
+    def snapshot(self):
+        with self.lock:
+            items = list(self.items)
+        return sorted(items, key=lambda item: item['total_ms'], reverse=True)
+
+
+slow_requests = SlowRequestBuffer(settings.METRICS_BUFFER_SIZE)
+
+
+# Сборщик текущего запроса. Переменная контекста доходит до потоков
+# sync_to_async, где виды выполняют SQL.
+current_collector = ContextVar('current_collector', default=None)
+
+
+class QueryCollector:
+    """execute_wrapper, считающий запросы и время в базе.
+
+    Запросы одного HTTP-запроса могут идти из нескольких потоков
+    одновременно, время в базе тогда суммируется.
+    """
+
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.duration = 0.0
+        self.serializer_duration = 0.0
+        self.statements = [] if keep_sql else None
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.duration += duration
+                self.count += 1
+                if self.statements is not None:
+                    self.statements.append(sql)
+
+
+# Идет ли в контексте сериализация, которую уже считает внешний .data.
+serializing = ContextVar('serializing', default=False)
+
+
+def time_serializer_data(fget):
+    """Обертка BaseSerializer.data: время сериализации текущего запроса.
+
+    SQL ленивых queryset, выполненный во время сериализации, уже учтен
+    в db и из времени сериализации вычитается. .data, вызванный внутри
+    другого сериализатора, второй раз не считается.
+    """
+    @functools.wraps(fget)
+    def data(serializer):
+        collector = current_collector.get()
+        if collector is None or serializing.get():
+            return fget(serializer)
+        token = serializing.set(True)
+        db_before = collector.duration
+        started = time.perf_counter()
+        try:
+            return fget(serializer)
+        finally:
+            elapsed = time.perf_counter() - started
+            serializing.reset(token)
+            with collector.lock:
+                collector.serializer_duration += max(
+                    elapsed - (collector.duration - db_before), 0
+                )
+    return data
+
+
+BaseSerializer.data = property(time_serializer_data(BaseSerializer.data.fget))
+
+
+def collect_queries(execute, sql, params, many, context):
+    """execute_wrapper соединений: передает SQL сборщику текущего запроса."""
+    collector = current_collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    return collector(execute, sql, params, many, context)
+
+
+def watch_connection(connection):
+    if collect_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(collect_queries)
+
+
+def watch_queries():
+    """Подключает collect_queries к соединениям текущего потока.
+
+    Обертка остается на соединении навсегда, а какому запросу
+    достанется SQL, решает current_collector: переменная контекста
+    копируется в потоки sync_to_async вместе с запросом.
+    """
+    for connection in connections.all():
+        watch_connection(connection)
+
+
+def connection_opened(sender, connection, **kwargs):
+    # Соединения, которые потоки откроют позже.
+    watch_connection(connection)
+
+
+connection_created.connect(connection_opened)
+
+
+class QueryMetricsMiddleware:
+    """Собирает метрики запроса и отдает их в заголовке Server-Timing.
+
+    db — время и число SQL-запросов, serialize — сериализаторы DRF
+    без их SQL, app — остальное время вида, render — рендер ответа DRF.
+    Заголовок получают staff-пользователи, остальные — только при
+    METRICS_SERVER_TIMING. Запросы медленнее METRICS_SLOW_REQUEST_MS
+    попадают в буфер slow_requests; при заданном METRICS_QUERY_BUDGET
+    запросы сверх бюджета логируются с нормализованным SQL.
+
+    Работает и под WSGI, и под ASGI: в асинхронном режиме SQL
+    считается в тех потоках, где его выполняют виды, — и в потоке
+    синхронного вида, и в потоках api.async_views.run_in_thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознает middleware как асинхронный.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        collector, started = self.start(request)
+        token = current_collector.set(collector)
+        watch_queries()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_collector.reset(token)
+        return self.finish(request, response, collector, started)
+
+    async def __acall__(self, request):
+        collector, started = self.start(request)
+        token = current_collector.set(collector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_collector.reset(token)
+        return self.finish(request, response, collector, started)
+
+    def start(self, request):
+        budget = settings.METRICS_QUERY_BUDGET
+        request.metrics = {'view': None, 'view_done': None}
+        return (
+            QueryCollector(keep_sql=budget is not None),
+            time.perf_counter()
+        )
+
+    def finish(self, request, response, collector, started):
+        budget = settings.METRICS_QUERY_BUDGET
+        finished = time.perf_counter()
+        view_done = request.metrics['view_done'] or finished
+        total = finished - started
+        render = finished - view_done
+        metrics = {
+            'view': request.metrics['view'] or request.path,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(collector.duration * 1000, 2),
+            'serialize_ms': round(collector.serializer_duration * 1000, 2),
+            # Параллельные запросы в базу могут дать суммарно больше total.
+            'app_ms': round(max(
+                total - render - collector.duration
+                - collector.serializer_duration, 0
+            ) * 1000, 2),
+            'render_ms': round(render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'size': (
+                None if response.streaming else len(response.content)
+            ),
+        }
+        if settings.METRICS_SERVER_TIMING or self.is_staff(request):
+            response['Server-Timing'] = (
+                'db;dur={db_ms};desc="{queries} queries", '
+                'serialize;dur={serialize_ms}, app;dur={app_ms}, '
+                'render;dur={render_ms}, '
+                'total;dur={total_ms}'.format(**metrics)
+            )
+        if metrics['total_ms'] >= settings.METRICS_SLOW_REQUEST_MS:
+            slow_requests.add(metrics)
+        if budget is not None and collector.count > budget:
+            self.log_queries(metrics, collector.statements)
+        return response
+
+    def is_staff(self, request):
+        # DRF переносит пользователя после аутентификации в HttpRequest.
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Под ASGI вызывается в том же потоке, что и синхронный вид.
+        watch_queries()
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            request.metrics['view'] = view_func.__name__
+            return
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        request.metrics['view'] = f'{view_class.__name__}.{action}'
+
+    def process_template_response(self, request, response):
+        # Вызывается после вида, но до рендера ответа.
+        request.metrics['view_done'] = time.perf_counter()
+        return response
+
+    def log_queries(self, metrics, statements):
+        counts = Counter(normalize_sql(sql) for sql in statements)
+        logger.warning(
+            '%s %s: %d queries over budget %d\n%s',
+            metrics['method'], metrics['view'], metrics['queries'],
+            settings.METRICS_QUERY_BUDGET,
+            '\n'.join(
+                f'{count:>4} x {sql}' for sql, count in counts.most_common()
+            )
+        )
+
+
+class SlowRequestsView(APIView):
+    """Медленные запросы этого процесса, самые долгие первыми."""
+
+    permission_classes = (IsAdminUser,)
+    pagination_class = None
+
+    def get(self, request):
+        return Response(slow_requests.snapshot())
@@ -1,5 +1,6 @@
 # flake8: noqa
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -33,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы учитывать время и запросы остальных middleware.
+    'backend.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,7 +73,10 @@ POSTGRE_DB = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'mysecretpassword'),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Асинхронные виды держат по соединению на поток пула, без
+        # переиспользования каждое чтение открывает новое.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
     }
 }
 
@@ -111,6 +117,10 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': [
         'api.pagination.FoodgramPagination',
     ],
@@ -134,6 +144,54 @@ DJOSER = {
 }
 
 
+# Версии справочников и кэш ответов должны быть общими для всех
+# процессов: воркеров и команд manage.py (load_data, recount). Поэтому
+# бэкенд по умолчанию файловый, а LocMemCache и DummyCache приложение
+# не принимает (api.cache.check_shared_caches).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'core.cache.AtomicFileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
+# Метрики запросов: заголовок Server-Timing, буфер медленных запросов
+# (/api/metrics/slow-requests/ для staff) и лог SQL сверх бюджета.
+# Server-Timing раскрывает устройство сервера, поэтому без
+# METRICS_SERVER_TIMING (по умолчанию — как DEBUG) его видит только staff.
+METRICS_SERVER_TIMING = os.getenv(
+    'METRICS_SERVER_TIMING', str(DEBUG)
+).lower() == 'true'
+METRICS_SLOW_REQUEST_MS = int(os.getenv('METRICS_SLOW_REQUEST_MS', 200))
+METRICS_BUFFER_SIZE = int(os.getenv('METRICS_BUFFER_SIZE', 100))
+METRICS_QUERY_BUDGET = (
+    int(os.getenv('METRICS_QUERY_BUDGET'))
+    if os.getenv('METRICS_QUERY_BUDGET') else None
+)
+
+REFERENCE_DATA_CACHE = 'default'
+REFERENCE_DATA_LOCAL_CACHE_SIZE = 256
+
+# Кэш ответов ленты и карточки рецепта для анонимов: запись живет не
+# дольше RESPONSE_CACHE_TIMEOUT секунд, сбрасывается по версиям данных.
+# Пока ответ считает один запрос, остальные ждут его до
+# RESPONSE_CACHE_LOCK_TIMEOUT секунд.
+RESPONSE_CACHE = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+RESPONSE_CACHE_LOCK_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_LOCK_TIMEOUT', 5)
+)
+
+
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Europe/Moscow'
 
@@ -148,6 +206,41 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Варианты картинок рецептов: имя -> максимальная ширина в пикселях.
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'card': 640,
+    'full': 1280,
+}
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
+# Лента подписок. Рецепт раскладывается по лентам подписчиков сразу,
+# если их не больше FEED_SYNC_FANOUT, иначе — в фоновом пуле; рецепты
+# авторов с FEED_CELEBRITY_FOLLOWERS подписчиков и больше не
+# раскладываются, а подмешиваются при чтении ленты. Ленты длиннее
+# FEED_MAX_LENGTH обрезаются при записи.
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', 500))
+FEED_SYNC_FANOUT = int(os.getenv('FEED_SYNC_FANOUT', 100))
+FEED_CELEBRITY_FOLLOWERS = int(os.getenv('FEED_CELEBRITY_FOLLOWERS', 10000))
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', 2))
+
+# Асинхронные list и retrieve тегов, ингредиентов и рецептов
+# (api.async_views). Включать при запуске через ASGI:
+# gunicorn backend.asgi -k uvicorn.workers.UvicornWorker.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# Файлы из multipart-запросов крупнее этого размера пишутся во временный
+# файл по частям, а не собираются в памяти.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 1024 * 1024)
+)
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR')
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
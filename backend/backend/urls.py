@@ -2,8 +2,15 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 
+from backend.metrics import SlowRequestsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path(
+        'api/metrics/slow-requests/',
+        SlowRequestsView.as_view(),
+        name='slow-requests'
+    ),
     path('api/', include('api.urls')),
     path(
         'redoc/',
@@ -0,0 +1,24 @@
+"""Бенчмарки горячих путей API.
+
+Запуск из каталога backend (база берется из настроек проекта:
+IS_TEST_DB=True — SQLite, иначе Postgres из переменных окружения):
+
+    python -m benchmarks run --scale small --output before.json
+    python -m benchmarks run --scale small --output after.json
+    python -m benchmarks compare before.json after.json --threshold 0.1
+
+run работает с отдельной тестовой базой (benchmarks.sqlite3 или
+test_<POSTGRES_DB>) и заполняет ее, если она пуста; --fresh
+пересоздает ее. generate заполняет основную базу — для нагрузочного
+теста через locust (см. locustfile.py).
+
+    python -m benchmarks queries
+
+проверяет, что число запросов каждого маршрута не растет с данными
+(см. querycount.py).
+
+    python -m benchmarks concurrency --target wsgi=http://localhost:8000
+
+нагружает уже запущенные серверы одновременными клиентами, чтобы
+сравнить WSGI и ASGI (см. concurrency.py).
+"""
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import django
+
+SCALE_FIELDS = (
+    'users', 'recipes', 'ingredients', 'per_recipe', 'tags', 'favorites',
+    'cart', 'subscriptions',
+)
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+
+
+def get_parser(scales):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('generate', 'run'):
+        command = commands.add_parser(name)
+        command.add_argument('--scale', choices=scales, default='small')
+        for field in SCALE_FIELDS:
+            command.add_argument(
+                '--' + field.replace('_', '-'), type=int,
+                help='Override the value from --scale.'
+            )
+        command.add_argument('--seed', type=int, default=0)
+    run = commands.choices['run']
+    run.add_argument('--fresh', action='store_true',
+                     help='Recreate the benchmark database.')
+    run.add_argument('--only', action='append',
+                     help='Run only this scenario, can be repeated.')
+    run.add_argument('--rounds', type=int, default=20)
+    run.add_argument('--warmup', type=int, default=2)
+    run.add_argument('--output', default='benchmark-results.json')
+    run.add_argument('--baseline',
+                     help='Compare with this result file after the run.')
+    run.add_argument('--threshold', type=float, default=0.1)
+    compare = commands.add_parser('compare')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.1,
+                         help='Allowed slowdown, 0.1 means 10%%.')
+    queries = commands.add_parser(
+        'queries', help='Check that query counts do not grow with data.'
+    )
+    queries.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50])
+    concurrency = commands.add_parser(
+        'concurrency',
+        help='Compare throughput of running servers under concurrent clients.'
+    )
+    concurrency.add_argument(
+        '--target', action='append', required=True, type=parse_target,
+        help='name=url of a running server, can be repeated.'
+    )
+    concurrency.add_argument('--clients', type=int, nargs='+',
+                             default=[1, 10, 50])
+    concurrency.add_argument('--duration', type=float, default=10,
+                             help='Seconds per client count.')
+    concurrency.add_argument('--output', default='concurrency-results.json')
+    return parser
+
+
+def parse_target(value):
+    name, separator, url = value.partition('=')
+    if not separator or not name or not url:
+        raise argparse.ArgumentTypeError('expected name=url')
+    return name, url
+
+
+def scale_options(args, scales):
+    options = dict(scales[args.scale])
+    for field in SCALE_FIELDS:
+        if getattr(args, field) is not None:
+            options[field] = getattr(args, field)
+    return options
+
+
+def fill(args, scales):
+    from benchmarks.datagen import generate
+    options = scale_options(args, scales)
+    print(f'Generating data: {options}')
+    started = time.monotonic()
+    generate(seed=args.seed, stdout=sys.stdout, **options)
+    print(f'Data generated in {time.monotonic() - started:.1f} s')
+
+
+def use_benchmark_database(fresh, suffix=''):
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-benchmarks-')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = str(
+            settings.BASE_DIR / f'benchmarks{suffix}.sqlite3'
+        )
+    elif suffix:
+        connection.settings_dict['TEST']['NAME'] = (
+            f'test_{connection.settings_dict["NAME"]}{suffix}'
+        )
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, keepdb=not fresh
+    )
+
+
+def report(regressions):
+    for name, metric, before, after, change in regressions:
+        print(f'REGRESSION {name} {metric}: {before} -> {after} '
+              f'({change:+.0%})')
+    return 1 if regressions else 0
+
+
+def run(args, scales):
+    from api.models import Recipe
+    from benchmarks.runner import compare, run_benchmarks
+    use_benchmark_database(args.fresh)
+    if not Recipe.objects.exists():
+        fill(args, scales)
+    results = run_benchmarks(
+        names=args.only, rounds=args.rounds, warmup=args.warmup,
+        scale=scale_options(args, scales), stdout=sys.stdout
+    )
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f'Results saved to {args.output}')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        return report(compare(baseline, results, args.threshold))
+    return 0
+
+
+def queries(args):
+    from django.db import connection
+
+    from benchmarks.querycount import run_query_counts
+    database = connection.settings_dict['NAME']
+    # Отдельная база: данные run мешали бы считать объекты в списках.
+    use_benchmark_database(True, suffix='_queries')
+    try:
+        failures = run_query_counts(sizes=args.sizes, stdout=sys.stdout)
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+    if failures:
+        print(f'{failures} routes run more queries with more data.')
+    return 1 if failures else 0
+
+
+def concurrency(args):
+    from benchmarks.concurrency import run_concurrency
+    results = run_concurrency(
+        args.target, args.clients, args.duration, stdout=sys.stdout
+    )
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f'Results saved to {args.output}')
+    return 0
+
+
+def main():
+    setup_django()
+    from benchmarks.datagen import SCALES
+    args = get_parser(SCALES).parse_args()
+    if args.command == 'compare':
+        from benchmarks.runner import compare
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        with open(args.current, encoding='utf-8') as file:
+            current = json.load(file)
+        return report(compare(baseline, current, args.threshold))
+    if args.command == 'generate':
+        from api.models import Recipe
+        if Recipe.objects.exists():
+            print('The database already has recipes, refusing to add more.')
+            return 1
+        fill(args, SCALES)
+        return 0
+    if args.command == 'queries':
+        return queries(args)
+    if args.command == 'concurrency':
+        return concurrency(args)
+    return run(args, SCALES)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
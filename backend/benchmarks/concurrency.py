@@ -0,0 +1,112 @@
+"""Пропускная способность работающих серверов при одновременных клиентах.
+
+Оба сервера запускаются на одной базе (заполненной generate), например:
+
+    gunicorn backend.wsgi --workers 2 --bind :8000
+    ASYNC_VIEWS=True gunicorn backend.asgi --workers 2 \\
+        -k uvicorn.workers.UvicornWorker --bind :8001
+    python -m benchmarks concurrency --target wsgi=http://localhost:8000 \\
+        --target asgi=http://localhost:8001 --clients 1 10 50
+
+Каждый клиент — поток со своим keep-alive соединением, который по
+кругу запрашивает PATHS анонимно, пока не выйдет duration секунд.
+"""
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from benchmarks.runner import summarize
+
+PATHS = (
+    ('recipes', '/api/recipes/'),
+    ('recipes_tags', '/api/recipes/?tags=tag0&tags=tag1'),
+    ('recipes_page', '/api/recipes/?page=3'),
+    ('recipe', '/api/recipes/{recipe}/'),
+    ('tags', '/api/tags/'),
+    ('ingredients', '/api/ingredients/?name=мол'),
+)
+
+
+def run_client(base_url, paths, offset, deadline, timings, errors):
+    session = requests.Session()
+    index = offset
+    while time.monotonic() < deadline:
+        name, path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = session.get(base_url + path, timeout=30)
+            failed = response.status_code != 200
+        except requests.RequestException:
+            failed = True
+        if failed:
+            errors[name] += 1
+        else:
+            timings[name].append(time.perf_counter() - started)
+
+
+def measure(base_url, clients, duration):
+    """Нагружает сервер clients потоками и возвращает сводку."""
+    recipe = requests.get(
+        f'{base_url}/api/recipes/?limit=1', timeout=30
+    ).json()['results'][0]['id']
+    paths = [(name, path.format(recipe=recipe)) for name, path in PATHS]
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.monotonic() + duration
+    # Клиенты начинают с разных путей, чтобы нагрузка была смешанной.
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(base_url, paths, index, deadline, timings, errors)
+        )
+        for index in range(clients)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    total = sum(len(values) for values in timings.values())
+    return {
+        'clients': clients,
+        'requests': total,
+        'errors': sum(errors.values()),
+        'rps': round(total / elapsed, 1),
+        'all': summarize(
+            [value for values in timings.values() for value in values]
+        ) if total else None,
+        'paths': {
+            name: summarize(timings[name])
+            for name, _ in PATHS if timings[name]
+        },
+    }
+
+
+def run_concurrency(targets, clients, duration, stdout):
+    """Результаты для каждой пары (сервер, число клиентов)."""
+    results = {}
+    for name, base_url in targets:
+        base_url = base_url.rstrip('/')
+        results[name] = []
+        for count in clients:
+            result = measure(base_url, count, duration)
+            results[name].append(result)
+            stdout.write(format_result(name, result) + '\n')
+    return results
+
+
+def format_result(name, result):
+    line = (
+        f'{name:<8} clients {result["clients"]:>4}  '
+        f'{result["rps"]:>8.1f} req/s  errors {result["errors"]:>4}'
+    )
+    if result['all']:
+        line += (
+            f'  median {result["all"]["median_ms"]:>8.2f} ms'
+            f'  p95 {result["all"]["p95_ms"]:>8.2f} ms'
+        )
+    return line
@@ -0,0 +1,224 @@
+import csv
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from api.cache import bump_version
+from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                        ShoppingCart, Tag)
+from users.models import Subscribe, User
+
+BATCH_SIZE = 5000
+PASSWORD = 'benchmark-password'
+IMAGE_NAME = 'recipes/benchmark.png'
+# 1x1 PNG: файлы картинок в бенчмарках не важны, важна строка в БД.
+IMAGE_BYTES = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f8cfc000000301010018dd8db0'
+    '0000000049454e44ae426082'
+)
+SCALES = {
+    'small': {
+        'users': 100, 'recipes': 2000, 'ingredients': 2000,
+        'per_recipe': 8, 'tags': 8, 'favorites': 20, 'cart': 10,
+        'subscriptions': 10,
+    },
+    'medium': {
+        'users': 2000, 'recipes': 100000, 'ingredients': 20000,
+        'per_recipe': 10, 'tags': 8, 'favorites': 50, 'cart': 15,
+        'subscriptions': 20,
+    },
+    'large': {
+        'users': 20000, 'recipes': 1000000, 'ingredients': 500000,
+        'per_recipe': 10, 'tags': 8, 'favorites': 100, 'cart': 20,
+        'subscriptions': 30,
+    },
+}
+TAG_NAMES = (
+    'Завтрак', 'Обед', 'Ужин', 'Десерт', 'Выпечка', 'Суп', 'Салат',
+    'Напиток', 'Закуска', 'Гарнир', 'Соус', 'Веган',
+)
+
+
+def batched(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_insert(model, rows):
+    total = 0
+    for batch in batched(rows):
+        model.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+@contextmanager
+def explicit_pub_date():
+    """Отключает auto_now_add, чтобы даты публикации были разными."""
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def ingredient_names(count):
+    """Реальные названия из data/ingredients.csv, дальше — с номером."""
+    with open(settings.BASE_DIR / 'data' / 'ingredients.csv',
+              encoding='utf-8') as file:
+        base = [tuple(row) for row in csv.reader(file) if len(row) == 2]
+    for index in range(count):
+        name, unit = base[index % len(base)]
+        round_number = index // len(base)
+        yield (f'{name} {round_number}' if round_number else name), unit
+
+
+def create_users(count):
+    password = make_password(PASSWORD)
+    bulk_insert(User, (
+        User(
+            username=f'user{index}',
+            email=f'user{index}@benchmark.local',
+            first_name='Имя',
+            last_name=f'Фамилия {index}',
+            password=password,
+        ) for index in range(count)
+    ))
+    return list(User.objects.order_by('id').values_list('id', flat=True))
+
+
+def create_tags(count):
+    bulk_insert(Tag, (
+        Tag(
+            name=TAG_NAMES[index % len(TAG_NAMES)] + (
+                f' {index}' if index >= len(TAG_NAMES) else ''
+            ),
+            color='#{:06X}'.format(index * 0x1F3A5 % 0xFFFFFF),
+            slug=f'tag{index}',
+        ) for index in range(count)
+    ))
+    return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+
+def create_ingredients(count):
+    bulk_insert(Ingredient, (
+        Ingredient(name=name, measurement_unit=unit)
+        for name, unit in ingredient_names(count)
+    ))
+    return list(
+        Ingredient.objects.order_by('id').values_list('id', flat=True)
+    )
+
+
+def create_recipes(rnd, count, user_ids):
+    if not default_storage.exists(IMAGE_NAME):
+        default_storage.save(IMAGE_NAME, ContentFile(IMAGE_BYTES))
+    now = timezone.now()
+    with explicit_pub_date():
+        bulk_insert(Recipe, (
+            Recipe(
+                name=f'Рецепт {index}',
+                text='Смешать, подогреть, подать. ' * 5,
+                cooking_time=rnd.randint(1, 180),
+                image=IMAGE_NAME,
+                author_id=rnd.choice(user_ids),
+                pub_date=now - timedelta(
+                    minutes=count - index, seconds=rnd.randint(0, 59)
+                ),
+            ) for index in range(count)
+        ))
+    return list(Recipe.objects.order_by('id').values_list('id', flat=True))
+
+
+def create_recipe_relations(rnd, recipe_ids, tag_ids, ingredient_ids,
+                            per_recipe):
+    bulk_insert(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rnd.sample(tag_ids, rnd.randint(1, 3))
+    ))
+    bulk_insert(RecipeIngredient, (
+        RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=rnd.randint(1, 500),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in rnd.sample(
+            ingredient_ids, min(per_recipe, len(ingredient_ids))
+        )
+    ))
+
+
+def sample_authors(rnd, user_id, user_ids, count):
+    authors = rnd.sample(user_ids, min(count + 1, len(user_ids)))
+    return [author for author in authors if author != user_id][:count]
+
+
+def create_graph(rnd, user_ids, recipe_ids, favorites, cart, subscriptions):
+    bulk_insert(Favorite, (
+        Favorite(user_id=user_id, recipe_id=recipe_id)
+        for user_id in user_ids
+        for recipe_id in rnd.sample(
+            recipe_ids, min(favorites, len(recipe_ids))
+        )
+    ))
+    bulk_insert(ShoppingCart, (
+        ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+        for user_id in user_ids
+        for recipe_id in rnd.sample(recipe_ids, min(cart, len(recipe_ids)))
+    ))
+    bulk_insert(Subscribe, (
+        Subscribe(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in sample_authors(rnd, user_id, user_ids, subscriptions)
+    ))
+
+
+def generate(users, recipes, ingredients, per_recipe, tags, favorites,
+             cart, subscriptions, seed=0, stdout=None):
+    """Заполняет пустую базу синтетическими данными пачками bulk_create.
+
+    Сигналы при bulk_create не срабатывают, поэтому счетчики,
+    агрегаты списков покупок, ленты подписок, поисковые векторы и
+    версии справочников пересчитываются в конце целиком.
+    """
+    rnd = random.Random(seed)
+    user_ids = create_users(users)
+    tag_ids = create_tags(tags)
+    ingredient_ids = create_ingredients(ingredients)
+    recipe_ids = create_recipes(rnd, recipes, user_ids)
+    create_recipe_relations(
+        rnd, recipe_ids, tag_ids, ingredient_ids, per_recipe
+    )
+    create_graph(rnd, user_ids, recipe_ids, favorites, cart, subscriptions)
+    call_command('recount', stdout=stdout)
+    call_command('rebuild_shopping_lists', stdout=stdout)
+    call_command('rebuild_feeds', '--backfill', stdout=stdout)
+    call_command('rebuild_search_vectors', stdout=stdout)
+    # bulk_create не отправляет сигналы: ответы, сохраненные для
+    # прежних данных с теми же id, сбрасываем целиком.
+    caches[settings.RESPONSE_CACHE].clear()
+    bump_version('tags')
+    bump_version('ingredients')
+    if connection.vendor == 'postgresql':
+        # Без свежей статистики планировщик выбирает планы для пустых
+        # таблиц, и первые прогоны намеряют не то.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
@@ -0,0 +1,95 @@
+"""Нагрузочный сценарий для работающего сервера.
+
+    python -m benchmarks generate --scale medium
+    gunicorn backend.wsgi --workers 4
+    locust -f benchmarks/locustfile.py --host http://localhost:8000
+
+Пользователи из generate входят как user<N>@benchmark.local.
+"""
+import random
+
+from locust import HttpUser, between, task
+
+# Совпадает с benchmarks.datagen.PASSWORD; сам datagen не импортируется,
+# чтобы locust не поднимал Django.
+PASSWORD = 'benchmark-password'
+USERS = 100
+TAG_SLUGS = [f'tag{index}' for index in range(5)]
+SEARCH_PREFIXES = ('мол', 'са', 'кур', 'яй', 'му', 'то')
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo'
+    'AAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+class FoodgramUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        response = self.client.post('/api/auth/token/login/', json={
+            'email': f'user{random.randrange(USERS)}@benchmark.local',
+            'password': PASSWORD,
+        })
+        token = response.json()['auth_token']
+        self.client.headers['Authorization'] = f'Token {token}'
+        self.recipe_ids = [
+            recipe['id'] for recipe in
+            self.client.get('/api/recipes/?limit=50').json()['results']
+        ]
+
+    @task(10)
+    def feed(self):
+        self.client.get('/api/recipes/', name='/api/recipes/')
+
+    @task(4)
+    def feed_with_tags(self):
+        self.client.get(
+            '/api/recipes/',
+            params={'tags': random.sample(TAG_SLUGS, 3)},
+            name='/api/recipes/?tags'
+        )
+
+    @task(2)
+    def feed_popular(self):
+        self.client.get(
+            '/api/recipes/', params={'ordering': 'popular'},
+            name='/api/recipes/?ordering=popular'
+        )
+
+    @task(5)
+    def recipe_detail(self):
+        self.client.get(
+            f'/api/recipes/{random.choice(self.recipe_ids)}/',
+            name='/api/recipes/[id]/'
+        )
+
+    @task(3)
+    def ingredient_search(self):
+        self.client.get(
+            '/api/ingredients/',
+            params={'name': random.choice(SEARCH_PREFIXES)},
+            name='/api/ingredients/?name'
+        )
+
+    @task(2)
+    def subscriptions(self):
+        self.client.get(
+            '/api/users/subscriptions/', params={'recipes_limit': 3},
+            name='/api/users/subscriptions/'
+        )
+
+    @task(1)
+    def download_shopping_cart(self):
+        self.client.get('/api/recipes/download_shopping_cart/')
+
+    @task(1)
+    def create_recipe(self):
+        self.client.post('/api/recipes/', json={
+            'name': 'Рецепт из locust',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'tags': [1, 2],
+            'ingredients': [{'id': 1, 'amount': 10}, {'id': 2, 'amount': 5}],
+            'image': IMAGE,
+        }, name='/api/recipes/ [create]')
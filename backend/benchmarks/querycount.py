@@ -0,0 +1,189 @@
+"""Проверка, что число SQL-запросов не растет вместе с данными.
+
+Для каждого размера из SIZES база заполняется так, что каждый список
+отдает ровно size объектов, а у рецептов, авторов и списка покупок
+столько же вложенных тегов, ингредиентов и рецептов. Затем все
+маршруты из api/urls.py вызываются анонимом и авторизованным
+пользователем, и число запросов сравнивается между размерами.
+Проверку запускают python -m benchmarks queries и тест
+api.tests.test_query_counts.
+"""
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.cache import bump_version, local_cache
+from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                        ShoppingCart, Tag)
+from api.urls import router
+from backend.metrics import QueryCollector, normalize_sql
+from benchmarks.datagen import IMAGE_BYTES, IMAGE_NAME
+from users.models import Subscribe, User
+
+SIZES = (1, 10, 50)
+# Действия без тела запроса: их можно вызвать без подготовки данных.
+BODYLESS_METHODS = ('post', 'delete')
+VIEWSET_ACTIONS = ('create', 'update', 'partial_update', 'destroy')
+
+
+def create_recipe(author, name, tags, ingredients):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Текст рецепта.',
+        cooking_time=10, image=IMAGE_NAME,
+    )
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+def seed(size):
+    """Заполняет базу и возвращает (пользователь, id объектов маршрутов).
+
+    У пользователя size подписок, рецептов в избранном и в корзине.
+    Объекты для detail-маршрутов (автор и рецепт) с ним не связаны,
+    чтобы на них можно было подписаться и добавить в избранное.
+    """
+    if not default_storage.exists(IMAGE_NAME):
+        default_storage.save(IMAGE_NAME, ContentFile(IMAGE_BYTES))
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {index}', color=f'#{index:06X}', slug=f'tag{index}')
+        for index in range(size)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+        for index in range(size)
+    )
+    # SQLite не возвращает id из bulk_create.
+    tags = list(Tag.objects.all())
+    ingredients = list(Ingredient.objects.all())
+    user = User.objects.create(
+        username='viewer', email='viewer@queries.local',
+        first_name='Имя', last_name='Фамилия',
+    )
+    target = User.objects.create(
+        username='target', email='target@queries.local',
+        first_name='Имя', last_name='Фамилия',
+    )
+    for index in range(size):
+        author = User.objects.create(
+            username=f'author{index}', email=f'author{index}@queries.local',
+            first_name='Имя', last_name='Фамилия',
+        )
+        recipe = create_recipe(author, f'Рецепт {index}', tags, ingredients)
+        Subscribe.objects.create(user=user, author=author)
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        create_recipe(target, f'Рецепт автора {index}', tags, ingredients)
+    call_command('rebuild_shopping_lists', stdout=StringIO())
+    # Размеры откатываются, и id рецептов повторяются: без очистки
+    # анонимные ответы приходили бы из кэша предыдущего размера.
+    caches[settings.RESPONSE_CACHE].clear()
+    bump_version('tags')
+    bump_version('ingredients')
+    local_cache.clear()
+    return user, {
+        'users': target.id,
+        'recipes': target.recipes.values_list('id', flat=True)[0],
+        'tags': tags[0].id,
+        'ingredients': ingredients[0].id,
+    }
+
+
+def get_routes():
+    """(имя маршрута, basename, имя параметра, методы) из роутера api."""
+    routes = []
+    for pattern in router.urls:
+        arguments = list(pattern.pattern.regex.groupindex)
+        if 'format' in arguments:
+            continue
+        actions = getattr(pattern.callback, 'actions', {'get': 'get'})
+        methods = [
+            method for method, action in actions.items()
+            if method == 'get' or (
+                arguments and method in BODYLESS_METHODS
+                and action not in VIEWSET_ACTIONS
+            )
+        ]
+        if methods:
+            basename = pattern.name.split('-', 1)[0]
+            routes.append((pattern.name, basename, arguments, methods))
+    return routes
+
+
+def call(client, method, url, size):
+    """Выполняет запрос и возвращает (статус, список SQL)."""
+    queries = QueryCollector(keep_sql=True)
+    with connection.execute_wrapper(queries):
+        response = getattr(client, method)(
+            url, {'limit': size, 'recipes_limit': size}
+            if method == 'get' else None
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response.status_code, queries.statements
+
+
+def measure(size, routes):
+    user, ids = seed(size)
+    authenticated = APIClient()
+    authenticated.force_authenticate(user)
+    clients = (('anonymous', APIClient()), ('authenticated', authenticated))
+    results = {}
+    for name, basename, arguments, methods in routes:
+        url = reverse(name, kwargs={
+            argument: ids[basename] for argument in arguments
+        })
+        for who, client in clients:
+            for method in methods:
+                results[name, who, method.upper()] = call(
+                    client, method, url, size
+                )
+    return results
+
+
+def run_query_counts(sizes=SIZES, stdout=None):
+    """Возвращает число маршрутов, где запросов стало больше с данными."""
+    routes = get_routes()
+    runs = {}
+    for size in sizes:
+        with transaction.atomic():
+            runs[size] = measure(size, routes)
+            transaction.set_rollback(True)
+    failures = 0
+    for key in runs[sizes[0]]:
+        name, who, method = key
+        counts = [len(runs[size][key][1]) for size in sizes]
+        statuses = {runs[size][key][0] for size in sizes}
+        growing = len(set(counts)) > 1
+        failures += growing
+        stdout.write(
+            f'{"FAIL" if growing else "ok":<4} {method:<6} {name:<34} '
+            f'{who:<13} status {"/".join(map(str, sorted(statuses)))} '
+            f'queries {" -> ".join(map(str, counts))}\n'
+        )
+        if growing:
+            stdout.write(format_growth(
+                runs[sizes[0]][key][1], runs[sizes[-1]][key][1]
+            ))
+    return failures
+
+
+def format_growth(before, after):
+    """SQL, которого при большем размере стало больше."""
+    before = Counter(normalize_sql(sql) for sql in before)
+    after = Counter(normalize_sql(sql) for sql in after)
+    return ''.join(
+        f'     {before[sql]:>4} -> {count:<4} {sql}\n'
+        for sql, count in after.most_common() if count > before[sql]
+    )
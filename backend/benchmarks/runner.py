@@ -0,0 +1,152 @@
+import platform
+import statistics
+import time
+
+import django
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.metrics import QueryCollector
+from benchmarks.scenarios import SCENARIOS, Context
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    to_ms = 1000
+    return {
+        'rounds': len(timings),
+        'min_ms': round(timings[0] * to_ms, 3),
+        'median_ms': round(statistics.median(timings) * to_ms, 3),
+        'mean_ms': round(statistics.mean(timings) * to_ms, 3),
+        'p95_ms': round(
+            timings[min(len(timings) - 1, int(len(timings) * 0.95))] * to_ms,
+            3
+        ),
+        'max_ms': round(timings[-1] * to_ms, 3),
+        'stddev_ms': round(statistics.pstdev(timings) * to_ms, 3),
+        # Запросов в секунду на один воркер: раунды идут последовательно.
+        'rps': round(len(timings) / sum(timings), 1),
+    }
+
+
+def reset_peak_rss():
+    """Сбрасывает пик RSS процесса до текущего RSS (Linux 4.0+)."""
+    with open('/proc/self/clear_refs', 'w') as file:
+        file.write('5')
+
+
+def read_rss():
+    """Текущий и пиковый RSS процесса в KiB."""
+    with open('/proc/self/status') as file:
+        fields = dict(line.split(':', 1) for line in file)
+    return int(fields['VmRSS'].split()[0]), int(fields['VmHWM'].split()[0])
+
+
+def measure_rss(run, rollback):
+    """Пик RSS за один раунд и его прирост над RSS перед раундом.
+
+    В отличие от tracemalloc, RSS включает память вне аллокатора Python:
+    буферы драйвера БД, Pillow, сжатие. Без /proc замер пропускается.
+    """
+    try:
+        reset_peak_rss()
+        before, _ = read_rss()
+        run_round(run, rollback)
+        _, peak = read_rss()
+    except OSError:
+        return {}
+    return {'peak_rss_kb': peak, 'rss_growth_kb': peak - before}
+
+
+def run_round(run, rollback):
+    if not rollback:
+        return run()
+    with transaction.atomic():
+        run()
+        transaction.set_rollback(True)
+
+
+def measure(options, context, rounds, warmup):
+    run = options['setup'](context)
+    rounds = options['rounds'] or rounds
+    rollback = options['rollback']
+    for _ in range(warmup):
+        run_round(run, rollback)
+    # CaptureQueriesContext не подходит: request_started очищает
+    # connection.queries_log в начале каждого запроса.
+    queries = QueryCollector(keep_sql=False)
+    with connection.execute_wrapper(queries):
+        run_round(run, rollback)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        run_round(run, rollback)
+        timings.append(time.perf_counter() - started)
+    result = summarize(timings)
+    result['queries'] = queries.count
+    if options['memory']:
+        result.update(measure_rss(run, rollback))
+    return result
+
+
+def run_benchmarks(names=None, rounds=20, warmup=2, scale=None,
+                   stdout=None):
+    context = Context()
+    results = {}
+    for name, options in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(options, context, rounds, warmup)
+        if stdout is not None:
+            stdout.write(format_result(name, results[name]) + '\n')
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'scale': scale,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'benchmarks': results,
+    }
+
+
+def format_result(name, result):
+    line = (
+        f'{name:<32} median {result["median_ms"]:>9.2f} ms  '
+        f'p95 {result["p95_ms"]:>9.2f} ms  {result["rps"]:>8.1f} req/s  '
+        f'queries {result["queries"]:>3}'
+    )
+    if 'peak_rss_kb' in result:
+        line += (
+            f'  peak RSS {result["peak_rss_kb"]:>7} KiB '
+            f'(+{result["rss_growth_kb"]})'
+        )
+    return line
+
+
+def compare(baseline, current, threshold):
+    """Сравнивает два результата и возвращает список регрессий.
+
+    Регрессия — рост медианы или прироста RSS за раунд больше чем на
+    threshold (доля, 0.1 = 10%) или любое увеличение числа SQL-запросов.
+    """
+    regressions = []
+    for name, old in baseline['benchmarks'].items():
+        new = current['benchmarks'].get(name)
+        if new is None:
+            continue
+        checks = [
+            ('median_ms', old['median_ms'], new['median_ms'], threshold),
+            ('queries', old['queries'], new['queries'], 0),
+        ]
+        if 'rss_growth_kb' in old and 'rss_growth_kb' in new:
+            checks.append((
+                'rss_growth_kb', old['rss_growth_kb'],
+                new['rss_growth_kb'], threshold
+            ))
+        for metric, before, after, allowed in checks:
+            change = (after - before) / before if before else float('inf')
+            if after > before and change > allowed:
+                regressions.append((name, metric, before, after, change))
+    return regressions
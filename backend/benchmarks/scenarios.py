@@ -0,0 +1,282 @@
+import base64
+import io
+import json
+import os
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.cache import bump_version, local_cache
+from api.models import Ingredient, Recipe, ShoppingListItem, Tag
+from users.models import User
+
+SCENARIOS = {}
+CREATED_NAME = 'Рецепт из бенчмарка'
+UPLOAD_SIZE = 10 * 1024 * 1024
+SHOPPING_LIST_SIZES = (10, 100, 1000)
+
+
+def scenario(name, rounds=None, memory=False, rollback=False):
+    """Регистрирует сценарий.
+
+    Функция сценария получает Context и возвращает вызываемый объект,
+    выполняющий один раунд. memory=True — дополнительно замерить пик
+    RSS процесса за раунд; rounds — свое число раундов для тяжелых
+    сценариев; rollback=True — откатывать каждый раунд, чтобы
+    создающие запросы не меняли данные и не запускали фоновую
+    обработку картинок.
+    """
+    def decorator(func):
+        SCENARIOS[name] = {
+            'setup': func, 'rounds': rounds,
+            'memory': memory, 'rollback': rollback,
+        }
+        return func
+    return decorator
+
+
+def consume(response, status=200):
+    if response.status_code != status:
+        raise AssertionError(
+            f'{response.status_code} {response.get("Content-Type")}: '
+            f'{response.content[:200] if not response.streaming else ""}'
+        )
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class Context:
+    """Клиенты и идентификаторы, общие для всех сценариев."""
+
+    def __init__(self):
+        self.user = (
+            User.objects.filter(cart_user__isnull=False)
+            .order_by('id').first()
+        )
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[:20]
+        )
+        self.recipe_id = self.recipe_ids[0]
+        self.tag_slugs = list(
+            Tag.objects.order_by('id').values_list('slug', flat=True)[:5]
+        )
+        self.tag_ids = list(
+            Tag.objects.order_by('id').values_list('id', flat=True)[:2]
+        )
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)[:5]
+        )
+        self.search_word = Ingredient.objects.order_by('id').values_list(
+            'name', flat=True
+        )[0].split()[0]
+
+    def recipe_data(self, image):
+        return {
+            'name': CREATED_NAME,
+            'text': 'Описание рецепта из бенчмарка.',
+            'cooking_time': 10,
+            'tags': self.tag_ids,
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in self.ingredient_ids
+            ],
+            'image': image,
+        }
+
+
+def big_png(size):
+    """PNG из шума примерно заданного размера: шум почти не сжимается."""
+    side = int((size / 3) ** 0.5)
+    image = Image.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=0)
+    return buffer.getvalue()
+
+
+def get(client, url, params=None):
+    return lambda: consume(client.get(url, params))
+
+
+@scenario('feed_anonymous')
+def feed_anonymous(context):
+    def run():
+        # Новая версия recipes: каждый раунд строит ответ заново.
+        bump_version('recipes')
+        consume(context.anonymous.get('/api/recipes/'))
+    return run
+
+
+@scenario('feed_anonymous_cached')
+def feed_anonymous_cached(context):
+    return get(context.anonymous, '/api/recipes/')
+
+
+@scenario('feed_authenticated')
+def feed_authenticated(context):
+    return get(context.client, '/api/recipes/')
+
+
+@scenario('feed_tags_5')
+def feed_tags_5(context):
+    return get(context.client, '/api/recipes/', {'tags': context.tag_slugs})
+
+
+@scenario('feed_favorited_tags')
+def feed_favorited_tags(context):
+    return get(context.client, '/api/recipes/', {
+        'is_favorited': 1, 'tags': context.tag_slugs[:2]
+    })
+
+
+@scenario('feed_popular')
+def feed_popular(context):
+    return get(context.client, '/api/recipes/', {'ordering': 'popular'})
+
+
+@scenario('feed_page_50')
+def feed_page_50(context):
+    return get(context.client, '/api/recipes/', {'page': 50})
+
+
+@scenario('feed_limit_100')
+def feed_limit_100(context):
+    return get(context.client, '/api/recipes/', {'limit': 100})
+
+
+@scenario('feed_cursor_no_count')
+def feed_cursor_no_count(context):
+    first = json.loads(consume(context.client.get(
+        '/api/recipes/', {'cursor': '', 'count': 'false'}
+    )))
+    return get(context.client, first['next'])
+
+
+@scenario('feed_search')
+def feed_search(context):
+    return get(
+        context.client, '/api/recipes/', {'search': context.search_word}
+    )
+
+
+@scenario('feed_subscriptions')
+def feed_subscriptions(context):
+    return get(context.client, '/api/recipes/feed/')
+
+
+@scenario('recipe_detail')
+def recipe_detail(context):
+    return get(context.client, f'/api/recipes/{context.recipe_id}/')
+
+
+@scenario('ingredient_search')
+def ingredient_search(context):
+    def run():
+        # Без сброса раунды измеряли бы только кэш ответов.
+        local_cache.clear()
+        consume(context.anonymous.get('/api/ingredients/', {'name': 'мол'}))
+    return run
+
+
+@scenario('ingredients_all')
+def ingredients_all(context):
+    def run():
+        local_cache.clear()
+        consume(context.anonymous.get('/api/ingredients/'))
+    return run
+
+
+@scenario('ingredient_search_cached')
+def ingredient_search_cached(context):
+    return get(context.anonymous, '/api/ingredients/', {'name': 'мол'})
+
+
+@scenario('subscriptions')
+def subscriptions(context):
+    return get(
+        context.client, '/api/users/subscriptions/', {'recipes_limit': 3}
+    )
+
+
+def shopping_list_user(size):
+    """Пользователь со списком покупок из size строк.
+
+    Строки пишутся прямо в ShoppingListItem: скачивание читает только
+    его, а набрать корзину на точное число ингредиентов нельзя.
+    """
+    user, _ = User.objects.get_or_create(
+        username=f'shopping-list-{size}',
+        defaults={'email': f'shopping-list-{size}@example.com'}
+    )
+    user.shopping_list_items.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user=user, ingredient_id=pk, total_amount=100)
+        for pk in Ingredient.objects.order_by('id')
+        .values_list('id', flat=True)[:size]
+    )
+    return user
+
+
+def download_shopping_cart(fmt, size):
+    def setup(context):
+        client = APIClient()
+        client.force_authenticate(shopping_list_user(size))
+        return get(
+            client, '/api/recipes/download_shopping_cart/', {'format': fmt}
+        )
+    return setup
+
+
+# Пик RSS при скачивании не должен расти вместе со списком покупок.
+for fmt in ('txt', 'pdf'):
+    for size in SHOPPING_LIST_SIZES:
+        scenario(f'download_shopping_cart_{fmt}_{size}', memory=True)(
+            download_shopping_cart(fmt, size)
+        )
+
+
+@scenario('shopping_cart_batch_20', rollback=True)
+def shopping_cart_batch_20(context):
+    return lambda: consume(context.client.post(
+        '/api/recipes/shopping_cart/', {'ids': context.recipe_ids},
+        format='json'
+    ))
+
+
+@scenario('recipe_create', memory=True, rollback=True)
+def recipe_create(context):
+    image = 'data:image/png;base64,' + base64.b64encode(
+        big_png(64 * 1024)
+    ).decode()
+    return lambda: consume(context.client.post(
+        '/api/recipes/', context.recipe_data(image), format='json'
+    ), status=201)
+
+
+@scenario('upload_10mb_base64', rounds=5, memory=True, rollback=True)
+def upload_10mb_base64(context):
+    image = 'data:image/png;base64,' + base64.b64encode(
+        big_png(UPLOAD_SIZE)
+    ).decode()
+    return lambda: consume(context.client.post(
+        '/api/recipes/', context.recipe_data(image), format='json'
+    ), status=201)
+
+
+@scenario('upload_10mb_multipart', rounds=5, memory=True, rollback=True)
+def upload_10mb_multipart(context):
+    content = big_png(UPLOAD_SIZE)
+
+    def run():
+        data = context.recipe_data(
+            SimpleUploadedFile('image.png', content, 'image/png')
+        )
+        data['ingredients'] = json.dumps(data['ingredients'])
+        consume(context.client.post(
+            '/api/recipes/', data, format='multipart'
+        ), status=201)
+    return run
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class AtomicFileBasedCache(FileBasedCache):
+    """FileBasedCache, у которого add() атомарен между процессами.
+
+    Стандартный add() проверяет ключ и пишет файл отдельными шагами,
+    и два процесса могут одновременно получить True. Здесь значение
+    пишется во временный файл и ставится на место через os.link,
+    который не заменяет существующий файл: True получает один.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # has_key удаляет просроченный файл, иначе link на нем споткнется.
+        if self.has_key(key, version):
+            return False
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            os.link(tmp_path, fname)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+        return True
@@ -0,0 +1,23 @@
+class CounterFieldsMixin:
+    """Счетчики, которые меняются только UPDATE с F().
+
+    Полный save() существующей строки записал бы значения счетчиков,
+    прочитанные в начале запроса, и потерял бы приращения, сделанные
+    за это время. Поэтому без явного update_fields сохраняются все
+    загруженные поля, кроме counter_fields.
+    """
+
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if update_fields is None and not force_insert and (
+            not self._state.adding
+        ):
+            skipped = self.get_deferred_fields().union(self.counter_fields)
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+                and field.name not in skipped
+            ]
+        super().save(force_insert, force_update, using, update_fields)